@@ -5,14 +5,12 @@ import sys
 
 sys.path.append(os.path.abspath(".."))
 
-import pandas as pd
 import streamlit as st
-from src.spotify_client import get_spotify_client
-from src.dataset import expand_artists_from_user_likes
-from src.recommender import recommend_artists_by_genre
-from src.cache.cache_db import init_db
+from src.settings import (DEFAULT_REQUEST, MAX_PER_GENRE_SEARCH, MAX_RELATED, UNIVERSE_DEADLINE_S,
+                          UNIVERSE_MAX_AGE, UNIVERSE_MAX_API_CALLS)
 
-init_db()
+#os módulos de src (pandas, numpy, spotipy) são importados sob demanda,
+#dentro das funções, para que a primeira renderização da página seja rápida
 
 
 #TÍTULO
@@ -47,7 +45,7 @@ with col1:
     top_k = st.number_input('Quantas recomendações?',
         min_value=5,
         max_value=50,
-        value=15,
+        value=DEFAULT_REQUEST['top_k'],
         step=1
     )
 
@@ -56,7 +54,7 @@ with col2:
         'Peso do "underground" no score',
         min_value=0.0,
         max_value=1.0,
-        value=0.3,
+        value=DEFAULT_REQUEST['underground_weight'],
         step=0.05,
         help='0 = só similaridade de gêneros, 1 = só quão pouco popular é.'
     )
@@ -66,51 +64,239 @@ with col3:
         'Popularidade máxima (Spotify)',
         min_value=10,
         max_value=100,
-        value=50,
+        value=DEFAULT_REQUEST['max_popularity'],
         step=5,
         help='Bandas com popularidade acima disso serão descartadas.'
     )
 
+diversity = st.slider(
+    'Diversidade',
+    min_value=0.0,
+    max_value=1.0,
+    value=DEFAULT_REQUEST['diversity'],
+    step=0.05,
+    help='0 = ordem só pelo score; valores maiores evitam bandas com gêneros quase idênticos na lista.'
+)
+
+SOURCE_SPOTIFY = 'Spotify (universo a partir das bandas)'
+SOURCE_SNAPSHOT = 'Catálogo local (snapshot)'
+
+source = st.radio(
+    'Fonte dos artistas',
+    options=[SOURCE_SPOTIFY, SOURCE_SNAPSHOT],
+    horizontal=True,
+    help='O catálogo local é montado offline (python -m src.snapshots build) e não chama a API.'
+)
+
+progressive = st.checkbox(
+    'Mostrar resultados parciais durante a busca',
+    value=True,
+    help='Exibe recomendações provisórias enquanto as buscas por gênero terminam.'
+)
+
+profile = st.checkbox(
+    'Perfilar este pedido',
+    value=False,
+    help='Mede tempo (por função) e memória da montagem do universo e das recomendações '
+         'e grava o relatório em data/profiles/.'
+)
+
 
 
 
 #FUNÇÕES CACHED
 
+@st.cache_resource(show_spinner=False)
+def init_cache_db():
+    """
+    Inicializa o banco de cache uma única vez por processo
+    (e não a cada rerun do script).
+    """
+    from src.cache.cache_db import init_db
+    init_db()
+    return True
+
+
+@st.cache_resource(show_spinner=False)
+def warm_hot_requests():
+    """
+    Uma vez por processo, em segundo plano: calcula as respostas das
+    combinações de bandas mais pedidas (ver `src.analytics`) que já têm
+    universo em disco, para que caiam direto no cache de respostas.
+    """
+    import threading
+    from src.analytics import get_query_analytics, warm_results
+
+    def warm():
+        try:
+            warm_results(get_query_analytics().top_requests())
+        except Exception as e:
+            print(f'Erro ao aquecer o cache de respostas: {e}')
+
+    thread = threading.Thread(target=warm, name='result-warmer', daemon=True)
+    thread.start()
+    return thread
+
+
 @st.cache_resource(show_spinner=False)
 def get_spotify_client_cached():
+    from src.spotify_client import get_spotify_client
     return get_spotify_client()
 
 
-@st.cache_data(show_spinner=True)
-def build_universe(user_likes: list[str], max_related=30, max_per_genre_search=30):
+@st.cache_resource(show_spinner=False)
+def get_snapshot_server():
+    """
+    Servidor do catálogo local: carrega o snapshot publicado e troca para
+    versões novas em segundo plano (ver `src.snapshots`).
+    """
+    from src.snapshots import SnapshotServer
+    return SnapshotServer().start()
+
+
+@st.cache_resource(show_spinner=False, ttl=UNIVERSE_MAX_AGE)
+def build_universe(user_likes: list[str], max_related=MAX_RELATED, max_per_genre_search=MAX_PER_GENRE_SEARCH):
     """
     Usa a API do Spotify para expandir o universo de artistas a partir
     das bandas que o usuário gosta. Retorna df_with_genres.
+
+    O universo é gravado em `data/catalogs/` em formato mapeável em memória
+    (ver `src.catalog_store`) e devolvido como DataFrame somente leitura:
+    processos diferentes compartilham a mesma cópia física da matriz de
+    gêneros, e um acerto de cache não paga desserialização.
     """
-    sp = get_spotify_client_cached()
-    df_with_genres = expand_artists_from_user_likes(
-        sp,
-        user_likes=user_likes,
-        max_related=max_related,
-        max_per_genre_search=max_per_genre_search,
+    from src.catalog_store import universe_catalog_dir, load_or_build_catalog
+    from src.dataset import expand_artists_from_user_likes
+
+    def expand():
+        sp = get_spotify_client_cached()
+        return expand_artists_from_user_likes(
+            sp,
+            user_likes=user_likes,
+            max_related=max_related,
+            max_per_genre_search=max_per_genre_search,
+            deadline_s=UNIVERSE_DEADLINE_S,
+            max_api_calls=UNIVERSE_MAX_API_CALLS,
+        )
+
+    directory = universe_catalog_dir(user_likes,
+                                     max_related=max_related,
+                                     max_per_genre_search=max_per_genre_search)
+
+    return load_or_build_catalog(directory, expand, max_age=UNIVERSE_MAX_AGE)
+
+
+def universe_is_ready(user_likes: list[str]) -> bool:
+    """
+    Indica se o universo dessas bandas já está gravado em disco (e válido),
+    ou seja, se `build_universe` vai responder sem chamar a API.
+    """
+    from src.catalog_store import universe_catalog_dir, catalog_is_fresh
+
+    directory = universe_catalog_dir(user_likes,
+                                     max_related=MAX_RELATED,
+                                     max_per_genre_search=MAX_PER_GENRE_SEARCH)
+    return catalog_is_fresh(directory, max_age=UNIVERSE_MAX_AGE)
+
+
+def show_recommendations(recs):
+    """
+    Exibe a tabela de recomendações (colunas principais + link do Spotify).
+    """
+    cols_to_show = []
+    for col in ["name", "genres", "popularity", "similarity", "underground_score", "final_score", "spotify_url"]:
+        if col in recs.columns:
+            cols_to_show.append(col)
+
+    if 'genres' in recs.columns:
+        recs = recs.copy()
+        recs['genres'] = recs['genres'].apply(
+            lambda g: ', '.join(g) if isinstance(g, list) else str(g)
+        )
+
+    st.dataframe(
+        recs[cols_to_show].reset_index(drop=True),
+        column_config={
+            "spotify_url": st.column_config.LinkColumn(
+                "Link no Spotify",
+                display_text="Abrir no Spotify"
+            )
+        },
+        use_container_width=True,
+        hide_index=True
     )
-    return df_with_genres
 
 
-def apply_max_popularity_filter(df: pd.DataFrame, max_pop: int) -> pd.DataFrame:
+def stream_universe(user_likes: list[str], top_k: int, underground_weight: float, max_popularity: int,
+                    diversity: float = 0.0):
     """
-    Aplica filtro de popularidade máxima manualmente,
-    caso a função de recomendação ainda tenha isso fixo.
+    Monta o universo de forma progressiva, mostrando recomendações provisórias
+    a cada busca por gênero concluída, junto com o progresso (buscas concluídas
+    / planejadas). No final, grava o universo completo em disco, para que
+    `build_universe` o encontre pronto, e retorna None.
+
+    Se a montagem estourar o orçamento (tempo ou chamadas), o universo parcial
+    não é gravado: é retornado para ser usado só neste pedido.
+
+    As recomendações provisórias usam a mesma diversidade (MMR) do resultado
+    final, para que a lista não seja reordenada quando ele chegar.
     """
-    if 'popularity' not in df.columns:
-        return df
-    return df[df['popularity'] <= max_pop]
+    from src.catalog_store import save_catalog, universe_catalog_dir, is_complete
+    from src.dataset import iter_expand_artists_from_user_likes
+    from src.recommender import recommend_artists_by_genre
+
+    progress = st.progress(0.0, text='Buscando as bandas informadas...')
+    partial = st.empty()
+
+    sp = get_spotify_client_cached()
+    df_with_genres = None
+
+    for df_with_genres, done, planned in iter_expand_artists_from_user_likes(
+            sp,
+            user_likes=user_likes,
+            max_related=MAX_RELATED,
+            max_per_genre_search=MAX_PER_GENRE_SEARCH,
+            deadline_s=UNIVERSE_DEADLINE_S,
+            max_api_calls=UNIVERSE_MAX_API_CALLS):
+
+        progress.progress(done / planned if planned else 1.0,
+                          text=f'Buscas por gênero concluídas: {done}/{planned}')
+
+        if df_with_genres.empty:
+            continue
+
+        recs = recommend_artists_by_genre(df_with_genres, user_likes, top_k, underground_weight,
+                                          max_popularity=max_popularity,
+                                          diversity=diversity)
+
+        with partial.container():
+            st.caption(f'Resultados provisórios ({len(df_with_genres)} artistas no universo até agora)')
+            if not recs.empty:
+                show_recommendations(recs)
+
+    progress.empty()
+    partial.empty()
+
+    if df_with_genres is None:
+        return None
+
+    if not df_with_genres.empty and is_complete(df_with_genres):
+        save_catalog(df_with_genres, universe_catalog_dir(user_likes,
+                                                          max_related=MAX_RELATED,
+                                                          max_per_genre_search=MAX_PER_GENRE_SEARCH))
+        return None
+
+    #universo vazio ou incompleto (orçamento estourado): é usado só neste pedido
+    return df_with_genres
 
 
 
 #RODAR
 
 if st.button('Gerar recomendações'):
+    init_cache_db()
+    warm_hot_requests()
+
     if not band_input.strip():
         st.warning('Por favor, digite ao menos uma banda.')
         st.stop()
@@ -121,27 +307,95 @@ if st.button('Gerar recomendações'):
         st.warning('Não consegui entender nenhuma banda no input 😅')
         st.stop()
 
-    st.write('**Bandas informadas**', ', '.join(user_likes))
+    from src.profiling import profile_request
+
+    #com o perfil ligado, a montagem do universo e as recomendações (que ficam
+    #no cache de respostas para a renderização abaixo) entram no mesmo relatório
+    with profile_request(', '.join(user_likes), enabled=profile) as prof:
+        if source == SOURCE_SNAPSHOT:
+            if get_snapshot_server().get() is None:
+                st.error('Nenhum snapshot do catálogo publicado. Rode `python -m src.snapshots build`.')
+                st.stop()
+
+            #None = usar o snapshot ativo no momento de cada rerun
+            df_with_genres = None
+
+        else:
+            df_with_genres = None
+            if progressive and not universe_is_ready(user_likes):
+                df_with_genres = stream_universe(user_likes, top_k, underground_weight, max_popularity,
+                                                 diversity)
+
+            if df_with_genres is None:
+                with st.spinner('Buscando artistas similares no spotify....'):
+                    df_with_genres = build_universe(user_likes)
+
+            completeness = df_with_genres.attrs.get('completeness', {})
+            if not completeness.get('complete', True):
+                #universo parcial não fica no cache: o próximo pedido tenta de novo
+                build_universe.clear(user_likes)
+
+        if profile:
+            from src.cache.result_cache import recommend_artists_cached
+
+            recommend_artists_cached(df_with_genres if df_with_genres is not None else get_snapshot_server().get(),
+                                     user_likes, top_k, underground_weight, max_popularity, diversity)
+
+    st.session_state['profile_report'] = prof.report
+
+    #o universo fica na sessão para que o feedback (curtir / descartar) não
+    #precise montar tudo de novo a cada rerun do script
+    st.session_state['universe'] = (user_likes, df_with_genres)
+    st.session_state.pop('feedback', None)
+    #o pedido entra nas analytics uma vez, e não a cada rerun da tela
+    st.session_state['record_request'] = True
 
-    with st.spinner('Buscando artistas similares no spotify....'):
-        df_with_genres = build_universe(user_likes)
+
+if 'universe' in st.session_state:
+    from src.cache.result_cache import recommend_artists_cached, RESULT_CACHE
+    from src.catalog_index import catalog_version
+    from src.feedback import FeedbackSession
+
+    user_likes, df_with_genres = st.session_state['universe']
+    if df_with_genres is None:
+        #catálogo local: a troca de snapshot vale a partir do próximo rerun
+        df_with_genres = get_snapshot_server().get()
+    completeness = df_with_genres.attrs.get('completeness', {})
+
+    st.write('**Bandas informadas**', ', '.join(user_likes))
 
     if df_with_genres.empty:
         st.error('Não consegui montar um universo de artistas a partir dessas bandas.')
         st.stop()
 
-    st.success(f'Universo de artistas montado.')
+    if completeness.get('complete', True):
+        st.success(f'Universo de artistas montado.')
+    else:
+        st.warning(f"Universo parcial: {completeness['searches_done']}/{completeness['searches_planned']} "
+                   f"buscas por gênero concluídas dentro do limite "
+                   f"({completeness['budget_exhausted']}). As recomendações usam o que foi coletado.")
 
+    feedback = st.session_state.get('feedback')
+    if feedback is not None and feedback.version != catalog_version(df_with_genres):
+        #o feedback foi dado sobre outro snapshot do catálogo
+        st.session_state.pop('feedback', None)
+        feedback = None
 
     with st.spinner('Calculando recomendações....'):
-        recs = recommend_artists_by_genre(
-            df_with_genres=df_with_genres,
-            user_likes=user_likes,
-            top_k=top_k,
-            underground_weight=underground_weight
-        )
-
-        recs = apply_max_popularity_filter(recs, max_popularity)
+        if feedback is None:
+            #respostas idênticas (mesmas bandas, top_k, pesos e catálogo) saem do cache
+            recs = recommend_artists_cached(
+                df_with_genres=df_with_genres,
+                user_likes=user_likes,
+                top_k=top_k,
+                underground_weight=underground_weight,
+                max_popularity=max_popularity,
+                diversity=diversity,
+                record=st.session_state.pop('record_request', False)
+            )
+        else:
+            #com feedback, o perfil é atualizado de forma incremental (ver src.feedback)
+            recs = feedback.recommend(top_k, underground_weight, max_popularity, diversity)
 
     if recs.empty:
         st.warning("Nenhuma recomendação encontrada com os filtros atuais. "
@@ -154,30 +408,55 @@ if st.button('Gerar recomendações'):
 
     st.subheader("🎸 Recomendações")
 
-    cols_to_show = []
-    for col in ["name", "genres", "popularity", "similarity", "underground_score", "final_score", "spotify_url"]:
-        if col in recs.columns:
-            cols_to_show.append(col)
-
-    if 'genres' in recs.columns:
-        recs = recs.copy()
-        recs['genres'] = recs['genres'].apply(
-            lambda g: ', '.join(g) if isinstance(g, list) else str(g)
-        )
-
-    st.dataframe(
-        recs[cols_to_show].reset_index(drop=True),
-        column_config={
-            "spotify_url": st.column_config.LinkColumn(
-                "Link no Spotify", 
-                display_text="Abrir no Spotify" 
-            )
-        },
-        use_container_width=True,
-        hide_index=True
-    )
+    show_recommendations(recs)
 
     st.caption(f"Total de recomendações possíveis (antes de limitar em top_k): {len(recs)}")
 
+    cache_stats = RESULT_CACHE.stats()
+    st.caption(f"Cache de recomendações: {cache_stats['hits']} acertos, "
+               f"{cache_stats['misses']} falhas "
+               f"(taxa de acerto {cache_stats['hit_rate']:.0%})")
+
+    profile_report = st.session_state.get('profile_report')
+    if profile_report is not None:
+        with st.expander(f'Perfil do pedido ({profile_report.elapsed_s:.2f} s, '
+                         f'pico de {profile_report.peak_bytes / 2**20:.1f} MiB)'):
+            st.code(profile_report.text, language=None)
+            st.download_button('Baixar perfil (.prof)',
+                               data=profile_report.stats_path.read_bytes(),
+                               file_name=profile_report.stats_path.name)
+
+
+
+#FEEDBACK
+
+    names = dict(zip(recs['id'], recs['name']))
+
+    with st.form('feedback_form', clear_on_submit=True):
+        st.markdown('**Refinar recomendações**')
+        fcol1, fcol2 = st.columns(2)
+        with fcol1:
+            to_like = st.multiselect('Curti', options=list(names), format_func=names.get)
+        with fcol2:
+            to_dismiss = st.multiselect('Descartar', options=list(names), format_func=names.get)
+        submitted = st.form_submit_button('Aplicar feedback')
+
+    if submitted and (to_like or to_dismiss):
+        if feedback is None:
+            feedback = FeedbackSession(df_with_genres, user_likes)
+            st.session_state['feedback'] = feedback
+        for artist_id in to_like:
+            feedback.like(artist_id)
+        for artist_id in to_dismiss:
+            feedback.dismiss(artist_id)
+        st.rerun()
+
+    if feedback is not None:
+        st.caption(f"Feedback aplicado: {len(feedback.liked_ids())} artistas no perfil, "
+                   f"{len(feedback.dismissed_ids())} descartados.")
+        if st.button('Limpar feedback'):
+            st.session_state.pop('feedback', None)
+            st.rerun()
+
 else:
     st.info("Digite as bandas que você gosta e clique em **Gerar recomendações**.")
@@ -0,0 +1,79 @@
+#%%
+
+import io
+import os
+import sys
+import time
+
+ROOT = os.path.abspath("..") if os.path.basename(os.getcwd()) == "notebooks" else os.getcwd()
+sys.path.append(ROOT)
+
+import numpy as np
+import pandas as pd
+from src.features import GenreBinarizer, _normalize_genres, normalize_genres_bulk
+
+#CSV sintético: data/artists_basic.csv repetido até N_ROWS linhas
+N_ROWS = 200_000
+N_RUNS = 3
+
+# %%
+
+def make_genres_column(n_rows: int = N_ROWS) -> pd.Series:
+    """
+    Lê `data/artists_basic.csv` repetido até `n_rows` linhas, passando por
+    `read_csv` como numa ingestão real (a coluna genres chega como texto).
+    """
+    base = pd.read_csv(os.path.join(ROOT, 'data', 'artists_basic.csv'))
+    big = pd.concat([base] * (n_rows // len(base) + 1), ignore_index=True).iloc[:n_rows]
+    buffer = io.StringIO()
+    big.to_csv(buffer, index=False)
+    buffer.seek(0)
+    return pd.read_csv(buffer)['genres']
+
+
+def per_row(genres: pd.Series):
+    """
+    Caminho anterior: `_normalize_genres` linha a linha + vocabulário e
+    matriz montados a partir das listas.
+    """
+    lists = list(genres.apply(_normalize_genres))
+
+    classes = sorted({g for genre_list in lists for g in genre_list})
+    col_of = {g: i for i, g in enumerate(classes)}
+    rows = [r for r, genre_list in enumerate(lists) for _ in genre_list]
+    cols = [col_of[g] for genre_list in lists for g in genre_list]
+
+    matrix = np.zeros((len(lists), len(classes)), dtype=int)
+    matrix[rows, cols] = 1
+
+
+def bulk(genres: pd.Series):
+    lists, rows, cols, classes = normalize_genres_bulk(genres)
+    GenreBinarizer().fit_codes(len(lists), rows, cols, classes)
+
+
+def measure_rows_per_sec(fn, genres: pd.Series, n_runs: int = N_RUNS) -> float:
+    times = []
+    for _ in range(n_runs):
+        start = time.perf_counter()
+        fn(genres)
+        times.append(time.perf_counter() - start)
+    times.sort()
+    return len(genres) / times[len(times) // 2]
+
+# %%
+
+if __name__ == '__main__':
+    genres = make_genres_column()
+
+    #os dois caminhos precisam dar o mesmo resultado
+    assert normalize_genres_bulk(genres)[0] == genres.apply(_normalize_genres).tolist()
+
+    print(f'Linhas: {len(genres):,}\n')
+    slow = measure_rows_per_sec(per_row, genres)
+    fast = measure_rows_per_sec(bulk, genres)
+    print(f'{"_normalize_genres por linha":<32}{slow:>14,.0f} linhas/s')
+    print(f'{"normalize_genres_bulk":<32}{fast:>14,.0f} linhas/s')
+    print(f'\nGanho: {fast / slow:.1f}x')
+
+# %%
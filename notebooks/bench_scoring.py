@@ -0,0 +1,93 @@
+#%%
+
+import os
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.abspath("..") if os.path.basename(os.getcwd()) == "notebooks" else os.getcwd()
+sys.path.append(ROOT)
+
+import numpy as np
+from src.scoring import CHUNK_SIZE, SparseRows, score_top_k
+
+#catálogo sintético: n_artistas × n_gêneros, 1 a 3 gêneros por artista
+#(o modo "matriz inteira" precisa de n_artistas × n_gêneros × 8 bytes de RAM)
+N_ARTISTS = 400_000
+N_GENRES = 150
+TOP_K = 20
+N_RUNS = 3
+
+# %%
+
+def make_catalog(n_artists: int = N_ARTISTS, n_genres: int = N_GENRES, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    X = np.zeros((n_artists, n_genres), dtype=np.uint8)
+    for _ in range(3):
+        X[np.arange(n_artists), rng.integers(0, n_genres, n_artists)] = 1
+    popularity = rng.integers(0, 100, n_artists)
+    return X, popularity
+
+
+def normalize_rows(X: np.ndarray) -> SparseRows:
+    """
+    Linhas de `X` com norma L2 = 1 em `SparseRows` (o mesmo formato de
+    `CatalogIndex.normalized_rows`, aqui com ponderação 'binary').
+    """
+    rows, cols = np.nonzero(X)
+    values = X[rows, cols].astype(float)
+    norm = np.sqrt(np.bincount(rows, weights=values ** 2, minlength=len(X)))
+    indptr = np.searchsorted(rows, np.arange(len(X) + 1))
+    return SparseRows(indptr, cols, values / norm[rows], X.shape[1])
+
+
+def measure(X, popularity, profile, chunk_size: int, workers: int, n_runs: int = N_RUNS):
+    """
+    Mediana do tempo (s) e pico de memória alocada (MiB) de um `score_top_k`
+    sobre o catálogo inteiro.
+    """
+    candidates = np.arange(X.shape[0])
+    times = []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for _ in range(n_runs):
+            start = time.perf_counter()
+            score_top_k(X, popularity, popularity.max(), profile, candidates, TOP_K,
+                        chunk_size=chunk_size, executor=executor)
+            times.append(time.perf_counter() - start)
+
+        tracemalloc.start()
+        score_top_k(X, popularity, popularity.max(), profile, candidates, TOP_K,
+                    chunk_size=chunk_size, executor=executor)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    times.sort()
+    return times[len(times) // 2], peak / 2**20
+
+# %%
+
+if __name__ == '__main__':
+    X, popularity = make_catalog()
+    profile = X[:3].mean(axis=0)
+
+    print(f'Catálogo: {N_ARTISTS:,} artistas × {N_GENRES} gêneros, top_k={TOP_K}\n')
+    print(f'{"modo":<28}{"tempo (s)":>12}{"artistas/s":>16}{"pico (MiB)":>14}')
+
+    #um bloco só = score da matriz inteira de uma vez (comportamento antigo)
+    configs = [('matriz inteira', N_ARTISTS, 1)]
+    for workers in sorted({1, 2, 4, os.cpu_count() or 1}):
+        configs.append((f'blocos, {workers} thread(s)', CHUNK_SIZE, workers))
+
+    for label, chunk_size, workers in configs:
+        elapsed, peak = measure(X, popularity, profile, chunk_size, workers)
+        print(f'{label:<28}{elapsed:>12.3f}{N_ARTISTS / elapsed:>16,.0f}{peak:>14.1f}')
+
+    #linhas normalizadas uma vez (como no CatalogIndex): produto escalar esparso por bloco
+    normalized = normalize_rows(X)
+    workers = os.cpu_count() or 1
+    label = f'normalizadas, {workers} thread(s)'
+    elapsed, peak = measure(normalized, popularity, profile, CHUNK_SIZE, workers)
+    print(f'{label:<28}{elapsed:>12.3f}{N_ARTISTS / elapsed:>16,.0f}{peak:>14.1f}')
+
+# %%
@@ -0,0 +1,71 @@
+#%%
+
+import os
+import subprocess
+import sys
+
+ROOT = os.path.abspath("..") if os.path.basename(os.getcwd()) == "notebooks" else os.getcwd()
+
+#módulos medidos isoladamente, cada um em um processo Python novo (cold start)
+MODULES = [
+    'streamlit',
+    'src.spotify_client',
+    'src.features',
+    'src.recommender',
+    'src.dataset',
+]
+
+N_RUNS = 5
+
+# %%
+
+def measure_import_time(module: str, n_runs: int = N_RUNS) -> float:
+    """
+    Mede o tempo de importação de `module` em processos novos e retorna a
+    mediana, em milissegundos.
+    """
+    code = (
+        "import time; t = time.perf_counter(); "
+        f"import {module}; "
+        "print((time.perf_counter() - t) * 1000)"
+    )
+    times = []
+    for _ in range(n_runs):
+        out = subprocess.run([sys.executable, '-c', code], cwd=ROOT,
+                             capture_output=True, text=True, check=True)
+        times.append(float(out.stdout.strip()))
+    times.sort()
+    return times[len(times) // 2]
+
+
+def measure_first_render(n_runs: int = N_RUNS) -> float:
+    """
+    Mede o tempo até a primeira renderização de `app_streamlit.py`
+    (importações + execução do script sem clicar no botão), em processos novos.
+    Retorna a mediana, em milissegundos.
+    """
+    code = (
+        "import time; t = time.perf_counter(); "
+        "from streamlit.testing.v1 import AppTest; "
+        "at = AppTest.from_file('app_streamlit.py').run(timeout=60); "
+        "assert not at.exception; "
+        "print((time.perf_counter() - t) * 1000)"
+    )
+    times = []
+    for _ in range(n_runs):
+        out = subprocess.run([sys.executable, '-c', code], cwd=ROOT,
+                             capture_output=True, text=True, check=True)
+        times.append(float(out.stdout.strip().splitlines()[-1]))
+    times.sort()
+    return times[len(times) // 2]
+
+# %%
+
+print("=== Tempo de importação (mediana, ms) ===")
+for module in MODULES:
+    print(f'{module:<22} {measure_import_time(module):8.1f}')
+
+print("\n=== Tempo até a primeira renderização do app (mediana, ms) ===")
+print(f'{"app_streamlit.py":<22} {measure_first_render():8.1f}')
+
+# %%
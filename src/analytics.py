@@ -0,0 +1,397 @@
+#%%
+
+import argparse
+import atexit
+import hashlib
+import heapq
+import json
+import threading
+import time
+import zlib
+
+import numpy as np
+from src.cache.cache_db import decode_payload, encode_payload, get_connection, init_db
+from src.name_index import normalize_name
+from src.settings import DEFAULT_REQUEST, MAX_PER_GENRE_SEARCH, MAX_RELATED, UNIVERSE_MAX_AGE
+
+#%%
+
+#dimensões do count-min sketch: erro de contagem <= total × e / WIDTH
+#com probabilidade 1 - e^-DEPTH (4096 × 4 contadores = 128 KiB por sketch)
+SKETCH_WIDTH = 4096
+SKETCH_DEPTH = 4
+
+#itens mais frequentes guardados (com nome) por tipo
+HEAVY_HITTERS = 200
+
+#tipos de item contados em cada pedido
+KINDS = ('seed', 'genre', 'combo')
+
+#intervalo entre gravações das contagens no banco
+FLUSH_INTERVAL = 10.0
+
+# %%
+
+class CountMinSketch:
+    """
+    Count-min sketch: contagens aproximadas de itens em memória fixa
+    (`depth` × `width` contadores), independente de quantos itens distintos
+    aparecem.
+
+    - `add(item)`: soma 1 em um contador de cada linha (um hash por linha).
+    - `estimate(item)`: menor contador do item entre as linhas. Nunca
+      subestima; superestima no máximo `total × e / width` com alta
+      probabilidade.
+    - Sketches com as mesmas dimensões se somam (`merge`), o que permite
+      juntar as contagens de vários processos.
+
+    Os hashes vêm do blake2b (e não do `hash()` do Python, que muda a cada
+    processo), para que sketches gravados por processos diferentes sejam
+    compatíveis.
+    """
+
+    def __init__(self, width: int = SKETCH_WIDTH, depth: int = SKETCH_DEPTH, table: np.ndarray = None):
+        self.width = width
+        self.depth = depth
+        self.table = np.zeros((depth, width), dtype=np.int64) if table is None else table
+        self._rows = np.arange(depth)
+
+    def _columns(self, item: str) -> np.ndarray:
+        digest = hashlib.blake2b(item.encode('utf-8'), digest_size=8 * self.depth).digest()
+        return np.frombuffer(digest, dtype=np.uint64) % np.uint64(self.width)
+
+    def add(self, item: str, count: int = 1):
+        self.table[self._rows, self._columns(item)] += count
+
+    def estimate(self, item: str) -> int:
+        return int(self.table[self._rows, self._columns(item)].min())
+
+    @property
+    def total(self) -> int:
+        return int(self.table[0].sum())
+
+    def merge(self, other: 'CountMinSketch'):
+        self.table += other.table
+
+    def to_bytes(self) -> bytes:
+        return zlib.compress(self.table.tobytes(), 6)
+
+    @classmethod
+    def from_bytes(cls, data: bytes, width: int = SKETCH_WIDTH, depth: int = SKETCH_DEPTH):
+        table = np.frombuffer(zlib.decompress(data), dtype=np.int64).reshape(depth, width).copy()
+        return cls(width, depth, table)
+
+
+class HeavyHitters:
+    """
+    Itens mais frequentes de um fluxo: um `CountMinSketch` para as contagens
+    e um dicionário limitado a `capacity` itens com as maiores estimativas
+    (os únicos guardados com nome). Quando o dicionário enche, o item com a
+    menor estimativa sai.
+    """
+
+    def __init__(self, capacity: int = HEAVY_HITTERS, sketch: CountMinSketch = None, items: dict = None):
+        self.capacity = capacity
+        self.sketch = sketch or CountMinSketch()
+        self.items = items or {}
+
+    def add(self, item: str, count: int = 1):
+        self.sketch.add(item, count)
+        self.items[item] = self.sketch.estimate(item)
+        if len(self.items) > self.capacity:
+            del self.items[min(self.items, key=self.items.get)]
+
+    def merge(self, other: 'HeavyHitters'):
+        """
+        Soma as contagens de `other` e reavalia os candidatos dos dois lados
+        com o sketch somado.
+        """
+        self.sketch.merge(other.sketch)
+        candidates = set(self.items) | set(other.items)
+        estimates = {item: self.sketch.estimate(item) for item in candidates}
+        self.items = dict(heapq.nlargest(self.capacity, estimates.items(), key=lambda kv: kv[1]))
+
+    def top(self, n: int = 20) -> list[tuple[str, int]]:
+        return heapq.nlargest(n, self.items.items(), key=lambda kv: kv[1])
+
+# %%
+
+def combo_key(user_likes: list[str]) -> str:
+    """
+    Chave de uma combinação de bandas: o mesmo conjunto canônico (normalizado
+    e ordenado) usado nas chaves de universo e de cache de respostas.
+    """
+    return json.dumps(sorted({normalize_name(n) for n in user_likes} - {''}), ensure_ascii=False)
+
+
+class QueryAnalytics:
+    """
+    Contagem, entre usuários e processos, das bandas, gêneros e combinações
+    de bandas pedidas ao recomendador.
+
+    Objetivo da classe
+    -------------------
+    Saber o que vale pré-calcular ou manter quente em cache, com memória
+    limitada: cada tipo de item (`KINDS`) é um `HeavyHitters`, então o custo
+    não cresce com o número de bandas distintas pedidas.
+
+    O que esta classe faz?
+    -----------------------
+    - `record(user_likes, genres)`: conta um pedido, só em memória. São alguns
+      hashes por item, sem I/O no caminho da requisição.
+    - Uma thread de fundo grava as contagens novas (deltas) na tabela
+      `query_analytics` do banco de cache a cada `flush_interval` segundos
+      (e na saída do processo), somando-as às que já estão lá em uma
+      transação. Assim, vários processos (workers do app, jobs) contribuem
+      para as mesmas contagens.
+    - `load()`: contagens gravadas + deltas ainda não gravados deste processo.
+    """
+
+    def __init__(self, flush_interval: float = FLUSH_INTERVAL, capacity: int = HEAVY_HITTERS):
+        self.flush_interval = flush_interval
+        self.capacity = capacity
+        self._pending = self._empty()
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._thread = None
+
+    def _empty(self) -> dict:
+        return {kind: HeavyHitters(self.capacity) for kind in KINDS}
+
+    def record(self, user_likes: list[str], genres=()):
+        seeds = sorted({normalize_name(n) for n in user_likes} - {''})
+        if not seeds:
+            return
+
+        with self._lock:
+            for seed in seeds:
+                self._pending['seed'].add(seed)
+            for genre in sorted(set(genres)):
+                self._pending['genre'].add(genre)
+            self._pending['combo'].add(combo_key(seeds))
+            self._start_writer()
+
+    def _start_writer(self):
+        if self._thread is not None:
+            return
+
+        def loop():
+            while True:
+                time.sleep(self.flush_interval)
+                try:
+                    self.flush()
+                except Exception as e:
+                    print(f'Erro ao gravar analytics de pedidos: {e}')
+
+        self._thread = threading.Thread(target=loop, name='query-analytics-writer', daemon=True)
+        self._thread.start()
+        atexit.register(self.flush)
+
+    def _read_stored(self, conn) -> dict:
+        stored = self._empty()
+        for kind, sketch, items in conn.execute("SELECT kind, sketch, items FROM query_analytics"):
+            if kind in stored:
+                stored[kind] = HeavyHitters(self.capacity, CountMinSketch.from_bytes(sketch),
+                                            decode_payload(items))
+        return stored
+
+    def flush(self) -> int:
+        """
+        Soma os deltas pendentes às contagens gravadas. Retorna quantos
+        pedidos foram gravados.
+        """
+        with self._write_lock:
+            with self._lock:
+                pending, self._pending = self._pending, self._empty()
+
+            n_requests = pending['combo'].sketch.total
+            if n_requests == 0:
+                return 0
+
+            init_db()
+            conn = get_connection()
+            with conn:
+                #lock de escrita já na leitura: dois processos não somam sobre o mesmo estado
+                conn.execute("BEGIN IMMEDIATE")
+                stored = self._read_stored(conn)
+                rows = []
+                for kind in KINDS:
+                    stored[kind].merge(pending[kind])
+                    rows.append((kind, stored[kind].sketch.to_bytes(), encode_payload(stored[kind].items),
+                                 time.time()))
+                conn.executemany(
+                    "INSERT OR REPLACE INTO query_analytics (kind, sketch, items, updated_at) VALUES (?, ?, ?, ?)",
+                    rows
+                )
+            return n_requests
+
+    def load(self) -> dict:
+        """
+        Contagens de todos os processos (gravadas) mais as pendentes deste.
+        """
+        init_db()
+        stored = self._read_stored(get_connection())
+        with self._lock:
+            for kind in KINDS:
+                stored[kind].merge(self._pending[kind])
+        return stored
+
+    def report(self, n: int = 20) -> dict:
+        """
+        Itens mais pedidos de cada tipo, com a contagem estimada.
+
+        Retorno
+        -------
+        dict
+            - requests : total de pedidos contados
+            - seed, genre, combo : listas [(item, contagem)] em ordem
+              decrescente; cada combinação vem como lista de bandas
+        """
+        counts = self.load()
+        report = {'requests': counts['combo'].sketch.total}
+        for kind in KINDS:
+            report[kind] = counts[kind].top(n)
+        report['combo'] = [(json.loads(key), count) for key, count in report['combo']]
+        return report
+
+    def top_requests(self, n: int = 20, min_count: int = 2) -> list[list[str]]:
+        """
+        Combinações de bandas mais pedidas (pelo menos `min_count` vezes),
+        prontas para passar como `user_likes`.
+        """
+        return [seeds for seeds, count in self.report(n)['combo'] if count >= min_count]
+
+# %%
+
+_analytics = None
+_analytics_lock = threading.Lock()
+
+
+def get_query_analytics() -> QueryAnalytics:
+    """
+    Contador de pedidos compartilhado pelo processo, criado na primeira chamada.
+    """
+    global _analytics
+    with _analytics_lock:
+        if _analytics is None:
+            _analytics = QueryAnalytics()
+        return _analytics
+
+
+def record_request(user_likes: list[str], df_with_genres=None):
+    """
+    Conta um pedido de recomendação: as bandas, a combinação e, se o
+    catálogo for informado, os gêneros dessas bandas no catálogo.
+    """
+    genres = []
+    if df_with_genres is not None and not df_with_genres.empty:
+        from src.recommender import find_liked_positions
+
+        for artist_genres in df_with_genres['genres'].iloc[find_liked_positions(df_with_genres, user_likes)]:
+            genres.extend(artist_genres)
+
+    get_query_analytics().record(user_likes, genres)
+
+# %%
+
+def warm_universes(sp, requests: list[list[str]], verbose: bool = True) -> int:
+    """
+    Monta e grava em `data/catalogs/` os universos das combinações de bandas
+    em `requests`, com os mesmos parâmetros do app. Universos já gravados (e
+    válidos) são pulados. Retorna quantos foram montados.
+    """
+    from src.catalog_store import catalog_is_fresh, load_or_build_catalog, universe_catalog_dir
+    from src.dataset import expand_artists_from_user_likes
+
+    built = 0
+    for user_likes in requests:
+        directory = universe_catalog_dir(user_likes,
+                                         max_related=MAX_RELATED,
+                                         max_per_genre_search=MAX_PER_GENRE_SEARCH)
+        if catalog_is_fresh(directory, max_age=UNIVERSE_MAX_AGE):
+            continue
+
+        if verbose:
+            print(f"Montando universo: {', '.join(user_likes)}")
+        load_or_build_catalog(directory,
+                              lambda: expand_artists_from_user_likes(sp,
+                                                                     user_likes=user_likes,
+                                                                     max_related=MAX_RELATED,
+                                                                     max_per_genre_search=MAX_PER_GENRE_SEARCH),
+                              max_age=UNIVERSE_MAX_AGE)
+        built += 1
+    return built
+
+
+def warm_results(requests: list[list[str]], catalog=None, params: dict = None) -> int:
+    """
+    Calcula (e guarda no cache de respostas do processo) as recomendações
+    das combinações em `requests`, com os parâmetros padrão do app.
+
+    `catalog` é o DataFrame a usar para todas (ex.: snapshot do catálogo
+    local). Sem ele, cada combinação usa o seu universo gravado em disco, e
+    as que ainda não têm universo são puladas. Retorna quantas respostas
+    foram calculadas.
+    """
+    from src.cache.result_cache import recommend_artists_cached
+    from src.catalog_store import catalog_is_fresh, load_catalog, universe_catalog_dir
+
+    params = {**DEFAULT_REQUEST, **(params or {})}
+
+    warmed = 0
+    for user_likes in requests:
+        df_with_genres = catalog
+        if df_with_genres is None:
+            directory = universe_catalog_dir(user_likes,
+                                             max_related=MAX_RELATED,
+                                             max_per_genre_search=MAX_PER_GENRE_SEARCH)
+            if not catalog_is_fresh(directory, max_age=UNIVERSE_MAX_AGE):
+                continue
+            df_with_genres = load_catalog(directory)
+
+        recommend_artists_cached(df_with_genres, user_likes, **params)
+        warmed += 1
+    return warmed
+
+# %%
+
+def print_report(report: dict):
+    print(f"Pedidos contados: {report['requests']}\n")
+    titles = {'seed': 'Bandas', 'genre': 'Gêneros', 'combo': 'Combinações de bandas'}
+    for kind in KINDS:
+        print(titles[kind])
+        for item, count in report[kind]:
+            label = ', '.join(item) if kind == 'combo' else item
+            print(f'  {count:>7}  {label}')
+        print()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Analytics dos pedidos de recomendação (bandas e gêneros mais pedidos).')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    report = sub.add_parser('report', help='Mostra as bandas, gêneros e combinações mais pedidos.')
+    report.add_argument('--top', type=int, default=20)
+
+    warm = sub.add_parser('warm', help='Monta os universos das combinações mais pedidas.')
+    warm.add_argument('--top', type=int, default=20)
+    warm.add_argument('--min-count', type=int, default=2,
+                      help='Só combinações pedidas pelo menos esse número de vezes.')
+
+    args = parser.parse_args(argv)
+    analytics = get_query_analytics()
+
+    if args.command == 'report':
+        print_report(analytics.report(args.top))
+    elif args.command == 'warm':
+        from src.spotify_client import get_spotify_client
+
+        requests = analytics.top_requests(args.top, args.min_count)
+        built = warm_universes(get_spotify_client(), requests)
+        print(f'Universos montados: {built} (de {len(requests)} combinações mais pedidas)')
+
+
+if __name__ == '__main__':
+    main()
+
+# %%
@@ -1,16 +1,122 @@
+import argparse
+import atexit
+import json
+import os
 import sqlite3
+import threading
+import time
+import zlib
+from contextlib import contextmanager
 from pathlib import Path
 
+from src.cache.lru import LRUCache
+
 DB_PATH = Path("data/cache.db")
 
+_local = threading.local()
 
-def get_connection():
-    DB_PATH.parent.mkdir(exist_ok=True)
-    return sqlite3.connect(DB_PATH)
+#conexões ociosas guardadas por banco (ver `pooled_connection`)
+POOL_MAX_IDLE = 8
 
+_pools = {}
+_pools_lock = threading.Lock()
 
-def init_db():
-    conn = get_connection()
+
+def _connect(path: Path, **kwargs) -> sqlite3.Connection:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30, **kwargs)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+def get_connection(path=None):
+    """
+    Retorna a conexão SQLite da thread atual com o banco `path` (default:
+    `DB_PATH`), criando-a na primeira chamada.
+
+    A conexão é reaproveitada por todas as chamadas seguintes da mesma thread
+    (sem custo de `connect` por operação) e usa modo WAL, em que leitores não
+    bloqueiam o escritor nem uns aos outros.
+    """
+    path = Path(path or DB_PATH)
+    conns = getattr(_local, 'conns', None)
+    if conns is None:
+        conns = _local.conns = {}
+    if path not in conns:
+        conns[path] = _connect(path)
+    return conns[path]
+
+
+@contextmanager
+def pooled_connection(path=None):
+    """
+    Empresta uma conexão SQLite (modo WAL) do pool do banco `path`
+    (default: `DB_PATH`) e a devolve no fim do bloco `with`.
+
+    Diferente de `get_connection`, a conexão não fica presa a uma thread: as
+    threads dos pools de cada pedido (`iter_expand_artists_from_user_likes`)
+    vêm e vão, e as conexões continuam abertas para os pedidos seguintes.
+    Até `POOL_MAX_IDLE` conexões ociosas ficam guardadas por banco.
+    """
+    path = Path(path or DB_PATH)
+    with _pools_lock:
+        idle = _pools.setdefault(path, [])
+        conn = idle.pop() if idle else None
+    if conn is None:
+        conn = _connect(path, check_same_thread=False)
+
+    try:
+        yield conn
+    finally:
+        with _pools_lock:
+            keep = len(idle) < POOL_MAX_IDLE
+            if keep:
+                idle.append(conn)
+        if not keep:
+            conn.close()
+
+
+def project_artist(artist: dict) -> dict:
+    """
+    Reduz o payload de artista da API aos campos usados pelo pipeline:
+    id, name, popularity, genres e external_urls.spotify.
+
+    Imagens, hrefs, objeto de seguidores etc. são descartados.
+    """
+    return {
+        'id': artist['id'],
+        'name': artist['name'],
+        'popularity': artist['popularity'],
+        'genres': list(artist['genres']),
+        'external_urls': {'spotify': artist.get('external_urls', {}).get('spotify', None)},
+    }
+
+
+def project_artist_list(artists: list) -> list:
+    return [project_artist(a) for a in artists]
+
+
+def encode_payload(value) -> bytes:
+    """
+    Serializa um valor para a coluna `data`: JSON compacto comprimido com zlib.
+    """
+    text = json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+    return zlib.compress(text.encode('utf-8'), 6)
+
+
+def decode_payload(data):
+    """
+    Inverso de `encode_payload`. Linhas antigas, gravadas como JSON em texto
+    (antes da compressão), também são lidas.
+    """
+    if isinstance(data, bytes):
+        data = zlib.decompress(data).decode('utf-8')
+    return json.loads(data)
+
+
+def init_db(path=None):
+    conn = get_connection(path)
     cursor = conn.cursor()
 
     cursor.execute("""
@@ -20,5 +126,350 @@ def init_db():
     )
     """)
 
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS spotify_genre_search (
+        genre TEXT PRIMARY KEY,
+        data TEXT
+    )
+    """)
+
+    #buscas sem resultado (cache negativo): artista não encontrado, gênero vazio
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS spotify_negative (
+        key TEXT PRIMARY KEY,
+        data TEXT,
+        updated_at REAL
+    )
+    """)
+
+    #contagens de pedidos (ver src.analytics): um count-min sketch e os itens
+    #mais frequentes por tipo (banda, gênero, combinação de bandas)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS query_analytics (
+        kind TEXT PRIMARY KEY,
+        sketch BLOB,
+        items BLOB,
+        updated_at REAL
+    )
+    """)
+
+    #bancos antigos não têm a coluna de data de atualização (usada no TTL)
+    for table in ['spotify_artist', 'spotify_genre_search']:
+        columns = {row[1] for row in cursor.execute(f"PRAGMA table_info({table})")}
+        if 'updated_at' not in columns:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN updated_at REAL")
+
     conn.commit()
-    conn.close()
+
+
+class TwoTierCache:
+    """
+    Cache em duas camadas: LRU em memória na frente de uma tabela SQLite.
+
+    Objetivo da classe
+    -------------------
+    Servir leituras quentes direto da memória do processo e compartilhar o
+    restante entre processos e reinícios via SQLite, sem abrir conexão por
+    chamada e sem disputa de lock entre sessões concorrentes do Streamlit.
+
+    O que esta classe faz?
+    -----------------------
+    - `get(key)`: procura no LRU; se não achar, em escritas ainda pendentes;
+      se não achar, no SQLite (conexão reaproveitada, ver `pooled_connection`).
+      O que vem do SQLite sobe para o LRU.
+    - `set(key, value)`: grava no LRU na hora e enfileira a escrita no SQLite
+      (write-behind). Uma thread de fundo grava a fila em lote, em uma única
+      transação, a cada `flush_interval` segundos ou quando a fila atinge
+      `batch_size`. Só essa thread escreve no banco.
+    - `flush()`: força a gravação imediata da fila (também chamada na saída
+      do processo).
+    - Entradas mais velhas que `ttl` segundos são tratadas como ausentes.
+
+    Parâmetros
+    ----------
+    table : str
+        Tabela SQLite (criada por `init_db`).
+    key_column : str
+        Coluna de chave primária da tabela.
+    project : callable, opcional
+        Função aplicada ao valor antes de guardá-lo (em memória e no disco),
+        para manter só os campos usados (ex.: `project_artist`).
+    maxsize : int, opcional (default=1024)
+        Tamanho do LRU em memória.
+    ttl : float ou None, opcional
+        Validade das entradas, em segundos. None = sem validade.
+    flush_interval : float, opcional (default=1.0)
+        Intervalo máximo entre gravações em lote.
+    batch_size : int, opcional (default=100)
+        Tamanho da fila que dispara uma gravação antecipada.
+    path : str ou Path, opcional
+        Arquivo do banco. Por padrão, o `DB_PATH` do momento da criação.
+
+    Observação: escritas ainda na fila são perdidas se o processo morrer
+    sem passar pelo `atexit`. Para um cache, isso só custa novas chamadas à API.
+    """
+
+    def __init__(self, table: str, key_column: str, maxsize: int = 1024, ttl: float = None,
+                 flush_interval: float = 1.0, batch_size: int = 100, project=None, path=None):
+        #o banco é fixado na criação: trocar `DB_PATH` depois não muda onde este cache lê e grava
+        self.path = Path(path or DB_PATH)
+        self.table = table
+        self.key_column = key_column
+        self.project = project
+        self.ttl = ttl
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+
+        self.memory = LRUCache(maxsize=maxsize)
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._wakeup = threading.Event()
+
+        self._writer = threading.Thread(target=self._write_behind_loop,
+                                        name=f'cache-writer-{table}', daemon=True)
+        self._writer.start()
+        atexit.register(self.flush)
+
+    def _is_fresh(self, updated_at) -> bool:
+        if self.ttl is None:
+            return True
+        return updated_at is not None and time.time() - updated_at <= self.ttl
+
+    def get(self, key, default=None):
+        entry = self.memory.get(key)
+        if entry is None:
+            with self._pending_lock:
+                entry = self._pending.get(key)
+
+        if entry is None:
+            with pooled_connection(self.path) as conn:
+                row = conn.execute(
+                    f"SELECT data, updated_at FROM {self.table} WHERE {self.key_column} = ?", (key,)
+                ).fetchone()
+            if row is None:
+                return default
+            entry = (decode_payload(row[0]), row[1])
+            self.memory.put(key, entry)
+
+        value, updated_at = entry
+        if not self._is_fresh(updated_at):
+            return default
+        return value
+
+    def set(self, key, value):
+        if self.project is not None:
+            value = self.project(value)
+        entry = (value, time.time())
+        self.memory.put(key, entry)
+
+        with self._pending_lock:
+            self._pending[key] = entry
+            full = len(self._pending) >= self.batch_size
+
+        if full:
+            self._wakeup.set()
+
+    def flush(self) -> int:
+        """
+        Grava no SQLite, em uma transação, todas as escritas pendentes.
+        Retorna quantas entradas foram gravadas.
+        """
+        with self._write_lock:
+            with self._pending_lock:
+                pending, self._pending = self._pending, {}
+
+            if not pending:
+                return 0
+
+            rows = [(key, encode_payload(value), updated_at)
+                    for key, (value, updated_at) in pending.items()]
+
+            with pooled_connection(self.path) as conn, conn:
+                conn.executemany(
+                    f"INSERT OR REPLACE INTO {self.table} ({self.key_column}, data, updated_at) "
+                    f"VALUES (?, ?, ?)",
+                    rows
+                )
+            return len(rows)
+
+    def _write_behind_loop(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except sqlite3.Error as e:
+                print(f'Erro ao gravar cache {self.table}: {e}')
+
+    def stats(self) -> dict:
+        stats = self.memory.stats()
+        with self._pending_lock:
+            stats['pending_writes'] = len(self._pending)
+        return stats
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+#validade das entradas: dados de artista mudam pouco; buscas por gênero mudam mais
+ARTIST_TTL = 7 * 24 * 3600
+GENRE_SEARCH_TTL = 24 * 3600
+#resultados vazios expiram antes: a banda pode ter sido digitada errado hoje e
+#existir amanhã, ou o gênero pode ganhar artistas
+NEGATIVE_TTL = 6 * 3600
+
+
+def _get_cache(table: str, key_column: str, **kwargs) -> TwoTierCache:
+    with _caches_lock:
+        if table not in _caches:
+            init_db(DB_PATH)
+            _caches[table] = TwoTierCache(table, key_column, path=DB_PATH, **kwargs)
+        return _caches[table]
+
+
+def get_artist_cache() -> TwoTierCache:
+    """
+    Cache de artistas buscados por nome (chave: nome normalizado).
+    """
+    return _get_cache('spotify_artist', 'artist_name', maxsize=4096, ttl=ARTIST_TTL,
+                      project=project_artist)
+
+
+def get_genre_search_cache() -> TwoTierCache:
+    """
+    Cache de resultados de busca por gênero (chave: gênero + limite).
+    """
+    return _get_cache('spotify_genre_search', 'genre', maxsize=512, ttl=GENRE_SEARCH_TTL,
+                      project=project_artist_list)
+
+
+def get_negative_cache() -> TwoTierCache:
+    """
+    Cache negativo: buscas que não trouxeram nada, com validade curta
+    (`NEGATIVE_TTL`). Chaves: 'artist:<nome normalizado>' e
+    'genre:<gênero>|<limite>'; o valor é só um marcador (True).
+    """
+    return _get_cache('spotify_negative', 'key', maxsize=4096, ttl=NEGATIVE_TTL)
+
+
+def flush_caches():
+    """
+    Grava as escritas pendentes de todos os caches abertos no processo.
+    """
+    with _caches_lock:
+        caches = list(_caches.values())
+    for cache in caches:
+        cache.flush()
+
+
+@contextmanager
+def use_cache_db(path):
+    """
+    Usa outro arquivo de banco de cache dentro do bloco `with` (ex.: um banco
+    temporário no teste de carga, para que respostas gravadas em um cassete
+    não entrem no cache usado pelo app).
+
+    As escritas pendentes são gravadas antes de cada troca, e os caches são
+    recriados sobre o banco da vez (a memória deles também recomeça vazia).
+    Cada cache continua gravando no banco em que foi criado, então um cache
+    obtido dentro do bloco nunca escreve no banco anterior, nem o contrário.
+    """
+    global DB_PATH
+
+    flush_caches()
+    with _caches_lock:
+        previous, DB_PATH = DB_PATH, Path(path)
+        _caches.clear()
+    try:
+        yield DB_PATH
+    finally:
+        flush_caches()
+        with _caches_lock:
+            DB_PATH = previous
+            _caches.clear()
+
+
+#tabelas do cache e a projeção de cada payload
+CACHE_TABLES = {
+    'spotify_artist': ('artist_name', project_artist),
+    'spotify_genre_search': ('genre', project_artist_list),
+    'spotify_negative': ('key', None),
+}
+
+
+def _db_size(conn) -> int:
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    return sum(os.path.getsize(p) for p in [DB_PATH, Path(f'{DB_PATH}-wal')] if os.path.exists(p))
+
+
+def _read_latency_ms(conn) -> float:
+    """
+    Tempo médio (ms) para ler e decodificar uma entrada do cache.
+    """
+    n_rows, start = 0, time.perf_counter()
+    for table, (key_column, _) in CACHE_TABLES.items():
+        keys = [r[0] for r in conn.execute(f"SELECT {key_column} FROM {table}")]
+        for key in keys:
+            row = conn.execute(f"SELECT data FROM {table} WHERE {key_column} = ?", (key,)).fetchone()
+            if row[0] is not None:
+                decode_payload(row[0])
+            n_rows += 1
+    return (time.perf_counter() - start) * 1000 / n_rows if n_rows else 0.0
+
+
+def compact_db() -> dict:
+    """
+    Compacta um banco de cache existente.
+
+    O que esta função faz?
+    -----------------------
+    1) Mede tamanho do arquivo e latência média de leitura.
+    2) Reescreve cada linha das tabelas de cache com o payload projetado
+       (só os campos usados) e comprimido (`encode_payload`), em uma transação.
+    3) Roda `VACUUM` para devolver o espaço livre ao sistema de arquivos.
+    4) Mede de novo e devolve o relatório antes/depois.
+    """
+    init_db()
+    conn = get_connection()
+
+    before = {'bytes': _db_size(conn), 'read_ms': _read_latency_ms(conn)}
+
+    rewritten = 0
+    with conn:
+        for table, (key_column, project) in CACHE_TABLES.items():
+            rows = conn.execute(f"SELECT {key_column}, data FROM {table}").fetchall()
+            updates = []
+            for key, data in rows:
+                if data is None:
+                    continue
+                value = decode_payload(data)
+                if project is not None:
+                    value = project(value)
+                updates.append((encode_payload(value), key))
+            conn.executemany(f"UPDATE {table} SET data = ? WHERE {key_column} = ?", updates)
+            rewritten += len(updates)
+
+    conn.execute("VACUUM")
+
+    after = {'bytes': _db_size(conn), 'read_ms': _read_latency_ms(conn)}
+
+    return {'rows': rewritten, 'before': before, 'after': after}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Manutenção do banco de cache (data/cache.db).')
+    parser.add_argument('command', choices=['compact'],
+                        help='compact: projeta e comprime os payloads existentes e roda VACUUM.')
+    args = parser.parse_args(argv)
+
+    if args.command == 'compact':
+        report = compact_db()
+        before, after = report['before'], report['after']
+        print(f"Linhas reescritas: {report['rows']}")
+        print(f"Tamanho: {before['bytes'] / 1024:.1f} KiB -> {after['bytes'] / 1024:.1f} KiB")
+        print(f"Leitura média: {before['read_ms']:.3f} ms -> {after['read_ms']:.3f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+#%%
+
+import threading
+from collections import OrderedDict
+
+#%%
+
+class LRUCache:
+    """
+    Cache em memória com tamanho máximo e descarte LRU (least recently used).
+
+    Objetivo da classe
+    -------------------
+    Guardar resultados já calculados (ex.: respostas completas de recomendação)
+    para que pedidos idênticos sejam respondidos sem recomputar nada.
+
+    O que esta classe faz?
+    -----------------------
+    - Mantém no máximo `maxsize` entradas em um `OrderedDict`.
+    - A cada leitura bem-sucedida, a entrada vai para o fim (mais recente).
+    - Ao inserir além do limite, descarta a entrada usada há mais tempo.
+    - Conta acertos (hits), falhas (misses) e descartes (evictions).
+    - É segura para uso concorrente (várias sessões do Streamlit).
+
+    Parâmetros
+    ----------
+    maxsize : int, opcional (default=256)
+        Número máximo de entradas mantidas no cache.
+    """
+
+    def __init__(self, maxsize: int = 256):
+        if maxsize <= 0:
+            raise ValueError('maxsize deve ser maior que zero')
+
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, predicate=None) -> int:
+        """
+        Remove entradas do cache.
+
+        Sem `predicate`, limpa tudo. Com `predicate(key) -> bool`, remove só as
+        chaves para as quais o predicado retorna True. Retorna quantas entradas
+        foram removidas.
+        """
+        with self._lock:
+            if predicate is None:
+                removed = len(self._data)
+                self._data.clear()
+                return removed
+
+            keys = [k for k in self._data if predicate(k)]
+            for k in keys:
+                del self._data[k]
+            return len(keys)
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'hit_rate': self.hits / total if total else 0.0,
+            }
+
+    def __len__(self):
+        return len(self._data)
+
+# %%
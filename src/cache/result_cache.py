@@ -0,0 +1,109 @@
+#%%
+
+import pandas as pd
+from src.analytics import record_request
+from src.cache.lru import LRUCache
+from src.catalog_index import DEFAULT_GENRE_WEIGHTING, catalog_version
+from src.name_index import normalize_name
+from src.profiling import profiled
+from src.recommender import recommend_artists_by_genre
+
+#%%
+
+def recommendation_key(user_likes: list[str],
+                       top_k: int,
+                       underground_weight: float,
+                       max_popularity,
+                       version: str,
+                       diversity: float = 0.0,
+                       genre_weighting: str = DEFAULT_GENRE_WEIGHTING) -> tuple:
+    """
+    Monta a chave canônica de uma requisição de recomendação.
+
+    As bandas viram um conjunto ordenado e normalizado (`normalize_name`, sem
+    duplicatas), então "Gojira, Mastodon" e "mastodon, GOJIRA" caem na mesma entrada.
+    """
+    seeds = tuple(sorted({normalize_name(n) for n in user_likes} - {''}))
+    return (version, seeds, int(top_k), round(float(underground_weight), 6), max_popularity,
+            round(float(diversity), 6), genre_weighting)
+
+# %%
+
+RESULT_CACHE = LRUCache(maxsize=256)
+
+
+@profiled
+def recommend_artists_cached(df_with_genres: pd.DataFrame,
+                             user_likes: list[str],
+                             top_k: int = 20,
+                             underground_weight: float = 0.3,
+                             max_popularity: int = 54,
+                             diversity: float = 0.0,
+                             genre_weighting: str = DEFAULT_GENRE_WEIGHTING,
+                             cache: LRUCache = None,
+                             record: bool = False):
+    """
+    Versão com cache de `recommend_artists_by_genre`.
+
+    Parâmetros
+    ----------
+    df_with_genres, user_likes, top_k, underground_weight, max_popularity, diversity, genre_weighting :
+        Mesmos parâmetros de `recommend_artists_by_genre`.
+
+    max_popularity : int ou None, opcional (default=54)
+        Popularidade máxima permitida, repassada a `recommend_artists_by_genre`.
+
+    cache : LRUCache, opcional
+        Cache a ser usado. Por padrão usa o cache global `RESULT_CACHE`.
+
+    record : bool, opcional (default=False)
+        Conta o pedido nas analytics de pedidos (`src.analytics.record_request`),
+        em acertos e falhas de cache. Quem chama liga só em pedidos novos do
+        usuário (não em reruns da mesma tela).
+
+    Retorno
+    -------
+    pandas.DataFrame
+        A resposta completa de recomendação. Em um acerto de cache, o mesmo
+        objeto é devolvido: quem for alterar o resultado deve trabalhar
+        em uma cópia.
+    """
+    if cache is None:
+        cache = RESULT_CACHE
+
+    if record:
+        record_request(user_likes, df_with_genres)
+
+    key = recommendation_key(user_likes, top_k, underground_weight,
+                             max_popularity, catalog_version(df_with_genres), diversity, genre_weighting)
+
+    recs = cache.get(key)
+    if recs is not None:
+        return recs
+
+    recs = recommend_artists_by_genre(
+        df_with_genres=df_with_genres,
+        user_likes=user_likes,
+        top_k=top_k,
+        underground_weight=underground_weight,
+        max_popularity=max_popularity,
+        diversity=diversity,
+        genre_weighting=genre_weighting
+    )
+
+    cache.put(key, recs)
+    return recs
+
+
+def invalidate_catalog(version: str = None) -> int:
+    """
+    Invalida respostas em cache quando o catálogo é atualizado.
+
+    Sem `version`, descarta todas as respostas. Com `version`, descarta só as
+    respostas calculadas sobre aquela versão do catálogo.
+    """
+    if version is None:
+        return RESULT_CACHE.invalidate()
+    return RESULT_CACHE.invalidate(lambda key: key[0] == version)
+
+# %%
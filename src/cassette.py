@@ -0,0 +1,222 @@
+#%%
+
+import importlib
+import inspect
+import itertools
+import json
+import random
+import threading
+import time
+from pathlib import Path
+
+from src import metrics
+
+#%%
+
+CASSETTE_PATH = Path(__file__).resolve().parent.parent / 'data' / 'cassettes' / 'spotify.jsonl'
+
+# %%
+
+def _search_signature(q, limit=10, offset=0, type='track', market=None):
+    pass
+
+
+def request_key(method: str, *args, **kwargs) -> str:
+    """
+    Chave canônica de uma chamada à API: o mesmo pedido feito com argumentos
+    posicionais, nomeados ou com valores padrão gera sempre a mesma chave.
+    """
+    bound = inspect.signature(_search_signature).bind(*args, **kwargs)
+    bound.apply_defaults()
+    return json.dumps([method, bound.arguments], sort_keys=True, ensure_ascii=False)
+
+# %%
+
+class InstrumentedSpotify:
+    """
+    Envolve um cliente `spotipy.Spotify` e mede cada chamada de `search`:
+
+    - `spotify.api_calls`   : número de chamadas
+    - `spotify.api_seconds` : tempo total de espera pela API
+    - `spotify.api_errors`  : chamadas que terminaram em erro (`SpotifyException`
+                              ou erro de rede, ex.: `requests.ConnectionError`)
+
+    Todos os outros atributos e métodos são repassados ao cliente original.
+    """
+
+    def __init__(self, sp):
+        self._sp = sp
+
+    def search(self, *args, **kwargs):
+        import spotipy
+
+        metrics.incr('spotify.api_calls')
+
+        start = time.perf_counter()
+        response, error = None, None
+        try:
+            response = self._sp.search(*args, **kwargs)
+            return response
+        except spotipy.exceptions.SpotifyException as e:
+            error = {'http_status': e.http_status, 'msg': e.msg}
+            metrics.incr('spotify.api_errors')
+            raise
+        except Exception as e:
+            error = {'type': f'{type(e).__module__}.{type(e).__qualname__}', 'msg': str(e)}
+            metrics.incr('spotify.api_errors')
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            metrics.incr('spotify.api_seconds', elapsed)
+            self._on_call(request_key('search', *args, **kwargs), elapsed, response, error)
+
+    def _on_call(self, key, elapsed, response, error):
+        pass
+
+    def __getattr__(self, name):
+        return getattr(self._sp, name)
+
+
+class RecordingSpotify(InstrumentedSpotify):
+    """
+    `InstrumentedSpotify` que também grava cada chamada de `search` em um
+    arquivo de "cassete" (JSON Lines), junto com a resposta e o tempo que a
+    API levou para responder.
+
+    Cada linha do arquivo tem o formato:
+
+        {
+            "key": "<chamada canônica>",
+            "elapsed": 0.231,                 segundos
+            "response": {...} ou null,
+            "error": {"http_status": 429, "msg": "..."} ou null
+        }
+
+    Erros que não vêm da API (rede, timeout) são gravados com o tipo da
+    exceção: {"type": "requests.exceptions.ReadTimeout", "msg": "..."}.
+    """
+
+    def __init__(self, sp, path=CASSETTE_PATH):
+        super().__init__(sp)
+        self._path = Path(path)
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def _on_call(self, key, elapsed, response, error):
+        entry = {
+            'key': key,
+            'elapsed': round(elapsed, 6),
+            'response': response,
+            'error': error,
+        }
+        with self._lock:
+            with open(self._path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+
+# %%
+
+class CassetteMiss(KeyError):
+    """
+    Chamada que não existe no cassete em modo replay.
+    """
+
+
+class CassetteError(RuntimeError):
+    """
+    Erro gravado no cassete cujo tipo original não pode ser recriado no replay.
+    """
+
+
+def _replay_error(error: dict) -> Exception:
+    """
+    Recria a exceção de uma entrada gravada com erro.
+    """
+    import spotipy
+
+    if 'type' not in error:
+        return spotipy.exceptions.SpotifyException(error['http_status'], -1, error['msg'])
+
+    module_name, _, class_name = error['type'].rpartition('.')
+    try:
+        cls = getattr(importlib.import_module(module_name), class_name)
+    except (ImportError, AttributeError, ValueError):
+        cls = None
+    if isinstance(cls, type) and issubclass(cls, Exception):
+        try:
+            return cls(error['msg'])
+        except TypeError:
+            pass
+    return CassetteError(f"{error['type']}: {error['msg']}")
+
+
+class ReplaySpotify:
+    """
+    Cliente falso do Spotify que responde `search` a partir de um cassete
+    gravado por `RecordingSpotify`, sem acesso à rede.
+
+    Parâmetros
+    ----------
+    path : str ou Path
+        Arquivo de cassete (JSON Lines).
+    speed : float, opcional (default=1.0)
+        Multiplicador do tempo de resposta. 1.0 reproduz a latência original
+        de cada chamada; 0.0 responde imediatamente.
+    on_miss : {'error', 'empty'}, opcional (default='error')
+        O que fazer com uma chamada não gravada: 'error' levanta `CassetteMiss`;
+        'empty' devolve uma busca sem resultados, com latência sorteada da
+        distribuição gravada.
+
+    O que esta classe faz?
+    -----------------------
+    - Agrupa as gravações por chamada canônica. Se a mesma chamada foi gravada
+      mais de uma vez, as respostas (e latências) são reproduzidas em ciclo,
+      preservando a distribuição de tempos original.
+    - Antes de responder, espera a latência gravada × `speed`.
+    - Erros gravados (ex.: 429) são levantados como `SpotifyException`;
+      erros de rede gravados, com o tipo original (ou `CassetteError`).
+    - Conta cada chamada na métrica `spotify.api_calls`.
+    """
+
+    def __init__(self, path=CASSETTE_PATH, speed: float = 1.0, on_miss: str = 'error', seed: int = None):
+        self.speed = speed
+        self.on_miss = on_miss
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+        entries = {}
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    entries.setdefault(entry['key'], []).append(entry)
+
+        self._cycles = {key: itertools.cycle(items) for key, items in entries.items()}
+        self._latencies = [e['elapsed'] for items in entries.values() for e in items]
+
+    def __len__(self):
+        return len(self._cycles)
+
+    def search(self, *args, **kwargs):
+        key = request_key('search', *args, **kwargs)
+        metrics.incr('spotify.api_calls')
+
+        miss_latency = 0.0
+        with self._lock:
+            cycle = self._cycles.get(key)
+            entry = next(cycle) if cycle is not None else None
+            if entry is None and self._latencies:
+                miss_latency = self._random.choice(self._latencies)
+
+        if entry is None:
+            if self.on_miss != 'empty':
+                raise CassetteMiss(key)
+            time.sleep(miss_latency * self.speed)
+            return {'artists': {'items': []}}
+
+        time.sleep(entry['elapsed'] * self.speed)
+
+        if entry['error'] is not None:
+            raise _replay_error(entry['error'])
+        return entry['response']
+
+# %%
@@ -0,0 +1,270 @@
+#%%
+
+import hashlib
+import threading
+
+import numpy as np
+import pandas as pd
+from src.cache.lru import LRUCache
+from src.features import get_genre_feature_matrix
+from src.scoring import SparseRows
+
+#%%
+
+#ponderação dos gêneros no cosseno: 'idf' reduz o peso de gêneros muito
+#comuns no catálogo; 'binary' usa a matriz 0/1 como está
+GENRE_WEIGHTINGS = ('idf', 'binary')
+DEFAULT_GENRE_WEIGHTING = 'idf'
+
+
+def _catalog_owner(df_with_genres: pd.DataFrame) -> tuple:
+    """
+    Identifica o objeto DataFrame exato (e o seu tamanho) dono da versão
+    gravada em `attrs`.
+    """
+    return (id(df_with_genres), len(df_with_genres))
+
+
+def set_catalog_version(df_with_genres: pd.DataFrame, version: str) -> str:
+    """
+    Grava a versão do catálogo em `df.attrs`, válida só para este objeto.
+    """
+    df_with_genres.attrs['catalog_version'] = version
+    df_with_genres.attrs['catalog_owner'] = _catalog_owner(df_with_genres)
+    return version
+
+
+def catalog_version(df_with_genres: pd.DataFrame) -> str:
+    """
+    Retorna a versão do catálogo (universo de artistas) representado pelo DataFrame.
+
+    Se o DataFrame já carrega a versão em `df.attrs['catalog_version']` (definida
+    por `expand_artists_from_user_likes` ou `load_catalog`), ela é usada
+    diretamente. Caso contrário, calcula uma impressão digital a partir de id,
+    popularidade e gêneros, e grava o valor em `attrs` para as próximas chamadas.
+
+    O pandas copia `attrs` para todo DataFrame derivado (filtro, ordenação,
+    cópia). Por isso a versão gravada só vale para o próprio objeto que a
+    recebeu (`attrs['catalog_owner']`): em um DataFrame derivado, ela é
+    recalculada a partir do conteúdo.
+
+    Qualquer mudança no catálogo (novo artista, popularidade ou gêneros diferentes)
+    gera uma versão nova, o que invalida naturalmente as respostas em cache.
+    """
+    version = df_with_genres.attrs.get('catalog_version')
+    if version and df_with_genres.attrs.get('catalog_owner') == _catalog_owner(df_with_genres):
+        return version
+
+    digest = hashlib.sha1()
+    if not df_with_genres.empty:
+        cols = [c for c in ['id', 'popularity', 'genres'] if c in df_with_genres.columns]
+        hashed = pd.util.hash_pandas_object(df_with_genres[cols].astype(str), index=False)
+        digest.update(hashed.values.tobytes())
+
+    return set_catalog_version(df_with_genres, digest.hexdigest()[:16])
+
+# %%
+
+class CatalogIndex:
+    """
+    Estruturas derivadas de um catálogo, calculadas uma vez por versão e
+    reaproveitadas por todas as requisições de recomendação.
+
+    Atributos
+    ---------
+    version : str
+        Versão do catálogo (`catalog_version`).
+    X : numpy.ndarray (uint8)
+        Matriz de gêneros 0/1 (n_artistas × n_gêneros). Se o catálogo veio de
+        `load_catalog`, é a própria matriz mapeada em memória (sem cópia).
+    genre_cols : list[str]
+        Nome de cada coluna de `X`.
+    popularity : numpy.ndarray
+        Popularidade de cada artista.
+    max_popularity : int
+        Maior popularidade do catálogo (usada para normalizar `pop_norm`).
+    ids : pandas.Index
+        Índice hash dos ids, para localizar artistas por id sem varrer a coluna.
+    idf : numpy.ndarray
+        Peso IDF de cada gênero, log((1 + n) / (1 + df)) + 1, onde `df` é o
+        número de artistas com o gênero. Gêneros que quase todo o catálogo
+        tem (ex.: "metal") pesam perto de 1; gêneros raros pesam mais.
+
+    Linhas ponderadas e normalizadas
+    --------------------------------
+    `normalized_rows(weighting)` devolve as linhas de `X` multiplicadas pelos
+    pesos dos gêneros e divididas pela própria norma L2 (`SparseRows`).
+    `posting_values(weighting)` devolve os mesmos valores na ordem das
+    posting lists. Os dois são calculados uma vez por versão e ponderação
+    (a ponderação padrão já no construtor). Com eles, o cosseno de um pedido
+    é só um produto escalar esparso com o perfil.
+
+    Listas invertidas por gênero (posting lists)
+    --------------------------------------------
+    Para cada gênero `j`, os artistas que têm esse gênero ficam em
+    `posting_rows[posting_ptr[j]:posting_ptr[j + 1]]`, ordenados por
+    popularidade crescente (`posting_pop` guarda as popularidades na mesma
+    ordem). Com isso, o teto de popularidade vira uma busca binária por gênero,
+    e os candidatos são obtidos antes de qualquer cálculo de similaridade.
+    """
+
+    def __init__(self, df_with_genres: pd.DataFrame):
+        self.version = catalog_version(df_with_genres)
+
+        X, genre_cols = get_genre_feature_matrix(df_with_genres)
+        self.X = np.asarray(X, dtype=np.uint8)
+        self.genre_cols = genre_cols
+        self.popularity = df_with_genres['popularity'].to_numpy()
+        self.max_popularity = self.popularity.max() if len(self.popularity) else 0
+        self.ids = pd.Index(df_with_genres['id'])
+
+        #posting lists: (gênero, popularidade) ordenados
+        rows, cols = np.nonzero(self.X)
+
+        order = np.lexsort((self.popularity[rows], cols))
+        self.posting_rows = rows[order]
+        self.posting_pop = self.popularity[self.posting_rows]
+        self.posting_ptr = np.searchsorted(cols[order], np.arange(len(genre_cols) + 1))
+
+        doc_freq = np.diff(self.posting_ptr)
+        self.idf = np.log((1 + len(self.popularity)) / (1 + doc_freq)) + 1
+
+        #entradas não nulas em ordem de linha (CSR) e a permutação para a ordem das posting lists
+        self._nz_rows, self._nz_cols = rows, cols
+        self._posting_order = order
+        self._weighted = {}
+        self._weighted_lock = threading.Lock()
+        self._build_weighted(DEFAULT_GENRE_WEIGHTING)
+
+    def __len__(self):
+        return len(self.popularity)
+
+    def positions(self, artist_ids) -> np.ndarray:
+        """
+        Posições (linhas) dos ids informados; ids desconhecidos são ignorados.
+        """
+        positions = self.ids.get_indexer(list(artist_ids))
+        return positions[positions >= 0]
+
+    def candidates(self, genre_idx, max_popularity=None) -> np.ndarray:
+        """
+        Artistas que têm pelo menos um dos gêneros `genre_idx` e popularidade
+        <= `max_popularity` (None = sem teto), em ordem de posição.
+
+        O custo é proporcional ao tamanho dos trechos de posting list que
+        sobrevivem ao teto, não ao tamanho do catálogo.
+        """
+        parts = []
+        for j in genre_idx:
+            start, end = self.posting_ptr[j], self.posting_ptr[j + 1]
+            if max_popularity is not None:
+                end = start + np.searchsorted(self.posting_pop[start:end], max_popularity, side='right')
+            parts.append(self.posting_rows[start:end])
+
+        if not parts:
+            return np.empty(0, dtype=np.intp)
+        return np.unique(np.concatenate(parts))
+
+    def genre_weights(self, weighting: str = DEFAULT_GENRE_WEIGHTING) -> np.ndarray:
+        """
+        Peso de cada gênero na ponderação `weighting` ('idf' ou 'binary').
+        """
+        if weighting == 'idf':
+            return self.idf
+        if weighting == 'binary':
+            return np.ones(len(self.genre_cols))
+        raise ValueError(f'Ponderação de gêneros desconhecida: {weighting!r} (use {GENRE_WEIGHTINGS})')
+
+    def genre_vectors(self, rows, weighting: str = DEFAULT_GENRE_WEIGHTING) -> np.ndarray:
+        """
+        Vetores de gênero (densos, já ponderados) das linhas `rows`.
+        """
+        return self.X[rows] * self.genre_weights(weighting)
+
+    def _build_weighted(self, weighting: str):
+        with self._weighted_lock:
+            if weighting in self._weighted:
+                return self._weighted[weighting]
+
+            rows, cols = self._nz_rows, self._nz_cols
+            values = self.X[rows, cols] * self.genre_weights(weighting)[cols]
+            norm = np.sqrt(np.bincount(rows, weights=values ** 2, minlength=len(self.popularity)))
+            data = values / norm[rows]
+
+            indptr = np.searchsorted(rows, np.arange(len(self.popularity) + 1))
+            normalized = SparseRows(indptr, cols, data, len(self.genre_cols))
+            self._weighted[weighting] = (normalized, data[self._posting_order])
+            return self._weighted[weighting]
+
+    def normalized_rows(self, weighting: str = DEFAULT_GENRE_WEIGHTING) -> SparseRows:
+        """
+        Linhas de `X` ponderadas por `genre_weights(weighting)` e com norma L2 = 1.
+        """
+        return self._build_weighted(weighting)[0]
+
+    def posting_values(self, weighting: str = DEFAULT_GENRE_WEIGHTING) -> np.ndarray:
+        """
+        Valores de `normalized_rows(weighting)` na ordem de `posting_rows`:
+        o valor do artista `posting_rows[i]` no gênero da lista que contém `i`.
+        """
+        return self._build_weighted(weighting)[1]
+
+# %%
+
+_INDEX_CACHE = LRUCache(maxsize=16)
+
+#universos parciais (montagem progressiva ainda em andamento) têm um LRU
+#próprio e pequeno: cada um é usado por poucos instantes e não deve
+#descartar os índices dos catálogos completos
+_PARTIAL_INDEX_CACHE = LRUCache(maxsize=4)
+
+#índices fixados (ex.: snapshot ativo do `SnapshotServer`), nunca descartados pelo LRU
+_pinned = {}
+_pinned_lock = threading.Lock()
+
+
+def pin_catalog_index(index: CatalogIndex) -> CatalogIndex:
+    """
+    Fixa o índice: `get_catalog_index` o devolve até `unpin_catalog_index`,
+    por mais versões que passem pelo LRU nesse meio tempo.
+    """
+    with _pinned_lock:
+        _pinned[index.version] = index
+    return index
+
+
+def unpin_catalog_index(version: str):
+    with _pinned_lock:
+        _pinned.pop(version, None)
+
+
+def _is_partial(df_with_genres: pd.DataFrame) -> bool:
+    """
+    True para um universo intermediário da montagem progressiva: ainda há
+    buscas planejadas por terminar e o orçamento não acabou.
+    """
+    completeness = df_with_genres.attrs.get('completeness')
+    return (completeness is not None
+            and completeness['budget_exhausted'] is None
+            and completeness['searches_done'] < completeness['searches_planned'])
+
+
+def get_catalog_index(df_with_genres: pd.DataFrame) -> CatalogIndex:
+    """
+    Retorna o `CatalogIndex` do catálogo, construindo-o só na primeira vez
+    em que cada versão aparece.
+    """
+    version = catalog_version(df_with_genres)
+
+    index = _pinned.get(version)
+    if index is not None:
+        return index
+
+    cache = _PARTIAL_INDEX_CACHE if _is_partial(df_with_genres) else _INDEX_CACHE
+    index = cache.get(version)
+    if index is None:
+        index = CatalogIndex(df_with_genres)
+        cache.put(version, index)
+    return index
+
+# %%
@@ -0,0 +1,265 @@
+#%%
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from src.features import get_genre_feature_matrix, BASE_COLS
+from src.catalog_index import catalog_version, set_catalog_version
+from src.name_index import normalize_name
+
+#%%
+
+CATALOG_DIR = Path(__file__).resolve().parent.parent / 'data' / 'catalogs'
+
+GENRES_FILE = 'genres.npy'
+POPULARITY_FILE = 'popularity.npy'
+META_FILE = 'meta.json'
+
+#arquivo, dentro do diretório do catálogo, com o nome da versão gravada mais recente
+CURRENT_FILE = 'CURRENT'
+
+#versões substituídas só são apagadas depois disso (segundos): um leitor que
+#acabou de ler `CURRENT` ainda encontra os arquivos da versão anterior
+PRUNE_GRACE_S = 60
+
+# %%
+
+def save_catalog(df_with_genres: pd.DataFrame, directory) -> Path:
+    """
+    Persiste um universo de artistas em um layout binário mapeável em memória.
+
+    Objetivo da função
+    -------------------
+    Permitir que vários processos (workers do Streamlit, jobs em lote) abram o
+    mesmo catálogo com `mmap`, compartilhando uma única cópia física da matriz
+    de gêneros via page cache do sistema operacional, e sem pagar
+    desserialização (pickle) a cada acesso.
+
+    Layout do diretório
+    -------------------
+    - `genres.npy`     : matriz 0/1 (n_artistas × n_gêneros), dtype uint8
+    - `popularity.npy` : vetor de popularidade (n_artistas), dtype int16
+    - `meta.json`      : colunas de texto (id, name, genres, spotify_url),
+                         nomes das colunas de gênero, versão do catálogo e
+                         `attrs` do DataFrame (ex.: `seed_ids`)
+
+    A escrita é atômica e segura com vários escritores ao mesmo tempo: cada
+    gravação vai para um subdiretório próprio de `directory` (nome único),
+    e só depois o arquivo `CURRENT` passa a apontar para ele (`os.replace`).
+    Leitores veem a versão anterior ou a nova, nunca um catálogo pela metade.
+    Se dois processos gravam o mesmo universo, vale o último; versões
+    substituídas são apagadas depois de `PRUNE_GRACE_S` segundos.
+
+    Parâmetros
+    ----------
+    df_with_genres : pandas.DataFrame
+        DataFrame retornado por `expand_artists_from_user_likes` / `add_genre_vectors`.
+    directory : str ou Path
+        Diretório de destino do catálogo.
+
+    Retorno
+    -------
+    Path
+        O diretório onde o catálogo foi gravado.
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+
+    X, genre_cols = get_genre_feature_matrix(df_with_genres)
+
+    meta = {
+        'version': catalog_version(df_with_genres),
+        'created_at': time.time(),
+        'genre_cols': list(genre_cols),
+        'id': df_with_genres['id'].tolist(),
+        'name': df_with_genres['name'].tolist(),
+        'genres': [list(g) for g in df_with_genres['genres']],
+        'spotify_url': df_with_genres['spotify_url'].tolist(),
+        'attrs': {k: v for k, v in df_with_genres.attrs.items() if k not in ('catalog_version', 'catalog_owner')},
+    }
+
+    tmp_dir = Path(tempfile.mkdtemp(prefix='.tmp-', dir=directory))
+    try:
+        np.save(tmp_dir / GENRES_FILE, np.ascontiguousarray(X, dtype=np.uint8))
+        np.save(tmp_dir / POPULARITY_FILE, df_with_genres['popularity'].to_numpy(dtype=np.int16))
+        with open(tmp_dir / META_FILE, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+
+        #nome único por gravação: escritores concorrentes nunca disputam o mesmo diretório
+        version_name = f'{time.time_ns()}-{os.getpid()}-{tmp_dir.name[len(".tmp-"):]}'
+        os.replace(tmp_dir, directory / version_name)
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    #marca a hora em que a versão anterior deixou de ser a publicada (início da carência)
+    previous = _current_dir(directory)
+    if previous is not None and previous != directory:
+        try:
+            os.utime(previous)
+        except FileNotFoundError:
+            pass
+
+    pointer = directory / f'.{CURRENT_FILE}.{version_name}.tmp'
+    pointer.write_text(version_name, encoding='utf-8')
+    os.replace(pointer, directory / CURRENT_FILE)
+
+    _prune_versions(directory)
+    return directory
+
+
+def _current_dir(directory):
+    """
+    Subdiretório da versão publicada em `directory`, ou None se não há
+    catálogo gravado. Catálogos no layout antigo (arquivos direto em
+    `directory`) continuam sendo lidos.
+    """
+    directory = Path(directory)
+    try:
+        name = (directory / CURRENT_FILE).read_text(encoding='utf-8').strip()
+    except (FileNotFoundError, NotADirectoryError):
+        name = ''
+
+    if name and (directory / name / META_FILE).exists():
+        return directory / name
+    if (directory / META_FILE).exists():
+        return directory
+    return None
+
+
+def _prune_versions(directory: Path, grace_s: float = PRUNE_GRACE_S):
+    """
+    Apaga versões substituídas há mais de `grace_s` segundos (e temporários
+    abandonados). A versão publicada nunca é apagada.
+    """
+    current = _current_dir(directory)
+    now = time.time()
+    for entry in directory.iterdir():
+        if not entry.is_dir() or entry == current:
+            continue
+        try:
+            if now - entry.stat().st_mtime > grace_s:
+                shutil.rmtree(entry, ignore_errors=True)
+        except FileNotFoundError:
+            pass
+
+
+def catalog_meta_path(directory):
+    """
+    Caminho do `meta.json` da versão publicada em `directory` (None se não houver).
+    """
+    current = _current_dir(directory)
+    return None if current is None else current / META_FILE
+
+# %%
+
+def load_catalog(directory) -> pd.DataFrame:
+    """
+    Abre um catálogo gravado por `save_catalog`, somente leitura e sem cópia.
+
+    Retorno
+    -------
+    pandas.DataFrame
+        DataFrame no mesmo formato de `add_genre_vectors` (colunas base +
+        colunas 0/1 de gênero). As colunas de gênero são uma visão da matriz
+        mapeada em memória (`np.load(mmap_mode='r')`): nada é copiado para a
+        memória do processo, e a matriz não pode ser alterada.
+
+        `attrs` traz a versão do catálogo (`catalog_version`), a data de criação
+        (`created_at`) e os demais metadados gravados (ex.: `seed_ids`).
+    """
+    current = _current_dir(directory)
+    if current is None:
+        raise FileNotFoundError(f'Nenhum catálogo gravado em {directory}')
+    directory = current
+
+    with open(directory / META_FILE, encoding='utf-8') as f:
+        meta = json.load(f)
+
+    X = np.load(directory / GENRES_FILE, mmap_mode='r')
+    popularity = np.load(directory / POPULARITY_FILE, mmap_mode='r')
+
+    df_base = pd.DataFrame({
+        'id': meta['id'],
+        'name': meta['name'],
+        'popularity': popularity,
+        'genres': meta['genres'],
+        'spotify_url': meta['spotify_url'],
+    }, columns=BASE_COLS)
+
+    genre_df = pd.DataFrame(X, columns=meta['genre_cols'], copy=False)
+
+    df_with_genres = pd.concat([df_base, genre_df], axis=1)
+    df_with_genres.attrs.update(meta['attrs'])
+    set_catalog_version(df_with_genres, meta['version'])
+    df_with_genres.attrs['created_at'] = meta['created_at']
+
+    return df_with_genres
+
+# %%
+
+def universe_catalog_dir(user_likes: list[str], **params) -> Path:
+    """
+    Diretório do catálogo correspondente a um conjunto de bandas (universo).
+
+    O nome é derivado do conjunto canônico de bandas (normalizado e ordenado)
+    e dos parâmetros da expansão, então pedidos equivalentes compartilham o
+    mesmo catálogo em disco.
+    """
+    seeds = sorted({normalize_name(n) for n in user_likes} - {''})
+    key = json.dumps([seeds, sorted(params.items())], ensure_ascii=False)
+    return CATALOG_DIR / hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
+
+
+def is_complete(df_with_genres: pd.DataFrame) -> bool:
+    """
+    Indica se o universo foi montado por inteiro (sem estourar orçamento).
+    DataFrames sem metadados de completude são considerados completos.
+    """
+    return df_with_genres.attrs.get('completeness', {}).get('complete', True)
+
+
+def catalog_is_fresh(directory, max_age: float = None) -> bool:
+    """
+    Indica se existe um catálogo completo em `directory` com no máximo
+    `max_age` segundos (None = qualquer idade).
+    """
+    meta_path = catalog_meta_path(directory)
+    if meta_path is None:
+        return False
+    if max_age is None:
+        return True
+    return time.time() - meta_path.stat().st_mtime <= max_age
+
+
+def load_or_build_catalog(directory, build_fn, max_age: float = None) -> pd.DataFrame:
+    """
+    Abre o catálogo em `directory`; se ele não existir (ou for mais velho que
+    `max_age` segundos), chama `build_fn()` para montar o DataFrame, grava
+    com `save_catalog` e abre a versão mapeada em memória.
+
+    Um DataFrame vazio, ou um universo incompleto (montagem interrompida por
+    tempo limite ou limite de chamadas, ver `df.attrs['completeness']`),
+    não é gravado: é devolvido como está, para que um próximo pedido tente
+    montar o universo completo.
+    """
+    directory = Path(directory)
+
+    if catalog_is_fresh(directory, max_age):
+        return load_catalog(directory)
+
+    df_with_genres = build_fn()
+    if df_with_genres.empty or not is_complete(df_with_genres):
+        return df_with_genres
+
+    save_catalog(df_with_genres, directory)
+    return load_catalog(directory)
+
+# %%
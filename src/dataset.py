@@ -2,12 +2,52 @@
 
 import os
 import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
+from concurrent.futures import TimeoutError as FutureTimeoutError
 
 sys.path.append(os.path.abspath(".."))
 
 import pandas as pd
-import spotipy
-from src.features import get_artist_by_name, add_genre_vectors
+from src.cache.cache_db import get_genre_search_cache, get_negative_cache
+from src.features import add_genre_vectors, BASE_COLS
+from src.name_index import find_artist, get_name_index, is_known_missing, normalize_name, resolve_artist
+from src.catalog_index import catalog_version
+from src.profiling import profiled
+
+# %%
+
+#buscas que ainda rodavam quando o seu pedido terminou (ver `wait_for_abandoned_searches`)
+_abandoned = set()
+_abandoned_lock = threading.Lock()
+
+
+def _forget_search(future):
+    with _abandoned_lock:
+        _abandoned.discard(future)
+
+
+def _abandon_searches(futures):
+    running = [f for f in futures if not f.done()]
+    with _abandoned_lock:
+        _abandoned.update(running)
+    for future in running:
+        future.add_done_callback(_forget_search)
+
+
+def wait_for_abandoned_searches(timeout: float = None) -> bool:
+    """
+    Espera as buscas que seguiam rodando quando os seus pedidos terminaram
+    (tempo limite estourado ou gerador fechado antes do fim).
+
+    Essas buscas ainda gravam o resultado nos caches ao terminar. Quem troca
+    o banco de cache (ex.: `src.loadtest`) espera por elas antes de trocar.
+    Retorna True se todas terminaram dentro de `timeout`.
+    """
+    with _abandoned_lock:
+        pending = list(_abandoned)
+    return not wait(pending, timeout=timeout).not_done
 
 # %%
 
@@ -91,79 +131,372 @@ def build_basic_artists_df(all_artists: dict):
             'spotify_url': info['spotify_url']
         })
 
-    df = pd.DataFrame(records)
+    df = pd.DataFrame(records, columns=BASE_COLS)
     return df
 
 # %%
 
-def expand_artists_from_user_likes(sp: spotipy.Spotify,
-                                   user_likes: list[str],
-                                   max_related: int = 20,
-                                   max_per_genre_search: int = 20):
+class UniverseBudget:
     """
-    Expande o universo de artistas a partir das bandas que o usuário gosta,
-    usando a API do Spotify (busca por gênero).
+    Orçamento de tempo e de chamadas à API para a montagem de um universo.
 
-    Retorna:
-        df_with_genres : DataFrame com artistas (likes + relacionados),
-                         já com colunas de gêneros 0/1 prontas para recomendação.
+    Parâmetros
+    ----------
+    deadline_s : float ou None
+        Tempo máximo de parede (segundos) desde o início da montagem.
+        None = sem limite de tempo.
+    max_api_calls : int ou None
+        Número máximo de chamadas à API do Spotify (resolução de bandas +
+        buscas por gênero). None = sem limite.
+
+    O que esta classe faz?
+    -----------------------
+    - Marca o instante de início e conta as chamadas feitas (`api_calls`).
+    - `remaining()` informa quantos segundos ainda restam (ou None).
+    - `can_call()` informa se ainda é possível fazer mais uma chamada.
+    - `exhaust(reason)` registra que o orçamento acabou ('deadline' ou
+      'max_api_calls'); a montagem então para e devolve o que já coletou.
+    """
+
+    def __init__(self, deadline_s: float = None, max_api_calls: int = None):
+        self.deadline_s = deadline_s
+        self.max_api_calls = max_api_calls
+        self.started_at = time.perf_counter()
+        self.api_calls = 0
+        self.exhausted_reason = None
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started_at
+
+    def remaining(self):
+        if self.deadline_s is None:
+            return None
+        return max(0.0, self.deadline_s - self.elapsed())
+
+    def can_call(self) -> bool:
+        if self.exhausted_reason is not None:
+            return False
+        if self.deadline_s is not None and self.remaining() <= 0:
+            self.exhaust('deadline')
+            return False
+        if self.max_api_calls is not None and self.api_calls >= self.max_api_calls:
+            self.exhaust('max_api_calls')
+            return False
+        return True
+
+    def exhaust(self, reason: str):
+        if self.exhausted_reason is None:
+            self.exhausted_reason = reason
+
+# %%
+
+def _build_universe_df(all_artists: dict, seed_ids: dict, verbose: bool = True, completeness: dict = None):
+    """
+    Monta o DataFrame do universo (colunas base + gêneros 0/1) a partir do
+    dicionário de artistas coletados, descartando artistas sem gênero.
+    """
+    #transforma dicionario em DF basico
+    df_artists = build_basic_artists_df(all_artists)
+
+    #adiciona colunas de generos 0/1
+    df_with_genres, mlb = add_genre_vectors(df_artists, verbose=verbose)
+    df_with_genres = df_with_genres[df_with_genres['genres'].apply(len) > 0]
+
+    #versão do catálogo, usada como parte da chave do cache de recomendações
+    catalog_version(df_with_genres)
+
+    #ids das bandas informadas (nome normalizado -> id), usados pelo recomendador
+    #para localizar as bandas curtidas sem comparar strings
+    df_with_genres.attrs['seed_ids'] = dict(seed_ids)
+
+    if completeness is not None:
+        df_with_genres.attrs['completeness'] = dict(completeness)
+
+    return df_with_genres
+
+# %%
+
+def iter_expand_artists_from_user_likes(sp: 'spotipy.Spotify',
+                                        user_likes: list[str],
+                                        max_related: int = 20,
+                                        max_per_genre_search: int = 20,
+                                        deadline_s: float = None,
+                                        max_api_calls: int = None,
+                                        max_workers: int = 4):
     """
+    Versão progressiva de `expand_artists_from_user_likes`: em vez de devolver
+    o universo só no final, produz (yield) universos parciais à medida que as
+    buscas por gênero terminam.
+
+    Cada item produzido é uma tupla:
+
+        (df_with_genres, searches_done, searches_planned)
+
+    - df_with_genres   : universo parcial, no mesmo formato do resultado final
+    - searches_done    : buscas por gênero já concluídas (com sucesso ou erro)
+    - searches_planned : total de buscas por gênero planejadas
+
+    Parâmetros de orçamento
+    -----------------------
+    deadline_s : float, opcional
+        Tempo máximo (segundos) para montar o universo. Ao estourar, as
+        buscas pendentes são canceladas e o universo coletado até ali é
+        devolvido.
+    max_api_calls : int, opcional
+        Número máximo de chamadas à API. Buscas além do limite não são feitas.
+    max_workers : int, opcional (default=4)
+        Buscas executadas em paralelo, em um pool de threads só deste pedido
+        (o default casa com o pool de clientes de `src.spotify_client`).
+
+    O que esta função faz?
+    -----------------------
+    1) Resolve todas as bandas informadas (índice local, cache de artistas
+       ou `sp.search`) e produz um primeiro universo só com elas
+       (`searches_done=0`). Só as idas à API contam em `api_calls`.
+    2) Planeja uma busca por gênero para cada gênero distinto das bandas
+       (gêneros repetidos entre bandas são buscados uma vez só).
+    3) Buscas feitas recentemente saem do cache de buscas por gênero
+       (`src.cache.cache_db`), sem chamada à API. Bandas não encontradas e
+       buscas por gênero vazias ficam num cache negativo (validade curta) e
+       também não geram chamada.
+    4) As demais são disparadas em um pool de threads e, a cada busca
+       concluída, o universo parcial atualizado é produzido.
+
+    Todo universo produzido traz em `df.attrs['completeness']` o quão completo
+    ele está:
+
+        {
+            'seeds_requested': int,   bandas informadas
+            'seeds_resolved': int,    bandas encontradas
+            'searches_planned': int,
+            'searches_done': int,
+            'api_calls': int,
+            'elapsed_s': float,
+            'complete': bool,         todas as buscas planejadas foram feitas
+            'budget_exhausted': str ou None   'deadline' ou 'max_api_calls'
+        }
+
+    O último item produzido é o universo final.
+    """
+    import spotipy
+
     all_artists = {}
+    seed_ids = {}
+    name_index = get_name_index()
     max_related=50
     max_per_genre_search=50
 
+    budget = UniverseBudget(deadline_s, max_api_calls)
+    #pool só deste pedido: buscas penduradas de outro pedido não atrasam esta
+    executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='expand')
+    futures = {}
+    submitted = []
+
+    genre_cache = get_genre_search_cache()
+    negative_cache = get_negative_cache()
+
+    #artistas sem gênero seriam descartados no final: pula logo
+    #(o payload do Spotify já traz os gêneros, então não há consulta a evitar)
+    def is_genreless(a):
+        return not a['genres']
+
+    #add o artista ao universo
+    def add_artist(a):
+        a_id = a['id']
+        if a_id not in all_artists:
+            all_artists[a_id] = {
+                'id': a_id,
+                'name': a['name'],
+                'popularity': a['popularity'],
+                'genres': a['genres'],
+                'spotify_url': a['external_urls'].get('spotify', None)
+            }
+
+    def search_genre(g):
+        key = f'{g}|{max_per_genre_search}'
+        try:
+            search_res = sp.search(q=f'genre:"{g}"', type='artist', limit=max_per_genre_search)
+            items = search_res['artists']['items']
+        except spotipy.exceptions.SpotifyException as e:
+            print(f'  Erro ao buscar por gênero {g}: {e}')
+            return []
+
+        items = [a for a in items if not is_genreless(a)]
+        if items:
+            genre_cache.set(key, items)
+        else:
+            negative_cache.set(f'genre:{key}', True)
+        return items
+
+    #artistas de buscas por gênero entram só no universo deste pedido, não no
+    #índice de nomes: um homônimo ali não deve decidir a resolução de bandas
+    def add_search_result(items):
+        for a in items:
+            if is_genreless(a):
+                continue
+            add_artist(a)
+
+    completeness = {
+        'seeds_requested': len(user_likes),
+        'seeds_resolved': 0,
+        'searches_planned': 0,
+        'searches_done': 0,
+        'api_calls': 0,
+        'elapsed_s': 0.0,
+        'complete': False,
+        'budget_exhausted': None,
+    }
+
+    def snapshot(verbose=False):
+        completeness['api_calls'] = budget.api_calls
+        completeness['elapsed_s'] = round(budget.elapsed(), 3)
+        completeness['budget_exhausted'] = budget.exhausted_reason
+        completeness['complete'] = (budget.exhausted_reason is None
+                                    and completeness['searches_done'] == completeness['searches_planned'])
+        return _build_universe_df(all_artists, seed_ids, verbose=verbose, completeness=completeness)
 
     print("\n=== Expandindo artistas a partir do gosto do usuário ===")
 
-    for name in user_likes:
-        print(f'\n>>>Buscando artista base: {name}')
-        artist = get_artist_by_name(sp, name)
-
-        if artist is None:
-            print(f'  Nenhum artista encontrado para: {name}')
-            continue
-
-        artist_id = artist['id']
-
-        #add o artista que o usuário gosta
-        def add_artist(a):
-            a_id = a['id']
-            if a_id not in all_artists:
-                all_artists[a_id] = {
-                    'id': a_id,
-                    'name': a['name'],
-                    'popularity': a['popularity'],
-                    'genres': a['genres'],
-                    'spotify_url': a['external_urls'].get('spotify', None)
-                }
-        
-        add_artist(artist)
-
-        #para cada genero de artista buscar mais artista por genero
-        for g in artist.get('genres', []):
-            print(f'  Buscando artistas pelo gênero: {g}')
-            try:
-                search_res = sp.search(q=f'genre:"{g}"', type='artist', limit=max_per_genre_search)
-                genre_artists = search_res['artists']['items']
-            except spotipy.exceptions.SpotifyException as e:
-                print(f'  Erro ao buscar por gênero {g}: {e}')
+    planned_genres = []
+
+    try:
+        for name in user_likes:
+            print(f'\n>>>Buscando artista base: {name}')
+
+            #artistas já conhecidos localmente (índice de nomes ou cache de
+            #artistas) não geram chamada à API nem gastam o orçamento
+            artist = find_artist(name, name_index)
+
+            if artist is None and is_known_missing(name):
+                print(f'  Nenhum artista encontrado para: {name} (cache negativo)')
                 continue
 
-            for a in genre_artists:
-                add_artist(a)
+            if artist is None:
+                if not budget.can_call():
+                    print(f'  Orçamento esgotado ({budget.exhausted_reason}), parando.')
+                    break
+
+                budget.api_calls += 1
+                future = executor.submit(resolve_artist, sp, name, name_index)
+                submitted.append(future)
+                try:
+                    artist = future.result(timeout=budget.remaining())
+                except FutureTimeoutError:
+                    budget.exhaust('deadline')
+                    print('  Tempo limite atingido, parando.')
+                    break
+
+            if artist is None:
+                print(f'  Nenhum artista encontrado para: {name}')
+                continue
 
+            completeness['seeds_resolved'] += 1
 
-    print(f'\nTotal de artistas coletados: {len(all_artists)}')     
+            if is_genreless(artist):
+                print(f'  Artista sem gêneros, ignorado: {artist["name"]}')
+                continue
 
-    #transforma dicionario em DF basico
-    df_artists = build_basic_artists_df(all_artists)
+            seed_ids[normalize_name(name)] = artist['id']
 
-    #adiciona colunas de generos 0/1
-    df_with_genres, mlb = add_genre_vectors(df_artists)
-    df_with_genres = df_with_genres[df_with_genres['genres'].apply(len) > 0]
+            #add o artista que o usuário gosta
+            add_artist(artist)
 
-    return df_with_genres
+            for g in artist.get('genres', []):
+                if g not in planned_genres:
+                    planned_genres.append(g)
+
+        searches_planned = len(planned_genres)
+        completeness['searches_planned'] = searches_planned
+        yield snapshot(), 0, searches_planned
 
+        #buscas por gênero já feitas recentemente saem do cache, sem API
+        to_search = []
+        for g in planned_genres:
+            key = f'{g}|{max_per_genre_search}'
+            if negative_cache.get(f'genre:{key}') is not None:
+                completeness['searches_done'] += 1
+                continue
+
+            cached = genre_cache.get(key)
+            if cached is None:
+                to_search.append(g)
+                continue
+
+            add_search_result(cached)
+            completeness['searches_done'] += 1
+
+        if completeness['searches_done']:
+            yield snapshot(verbose=not to_search), completeness['searches_done'], searches_planned
+
+        #para cada genero dos artistas buscar mais artistas por genero
+        for g in to_search:
+            if not budget.can_call():
+                break
+            print(f'  Buscando artistas pelo gênero: {g}')
+            budget.api_calls += 1
+            future = executor.submit(search_genre, g)
+            futures[future] = g
+            submitted.append(future)
+
+        try:
+            for n_finished, future in enumerate(as_completed(futures, timeout=budget.remaining()), start=1):
+                add_search_result(future.result())
+
+                completeness['searches_done'] += 1
+                searches_done = completeness['searches_done']
+
+                is_last = n_finished == len(futures)
+                yield snapshot(verbose=is_last), searches_done, searches_planned
+        except FutureTimeoutError:
+            budget.exhaust('deadline')
+            print(f'\n  Tempo limite atingido: {completeness["searches_done"]}/{searches_planned} buscas concluídas.')
+            yield snapshot(verbose=True), completeness['searches_done'], searches_planned
+
+        if len(futures) < len(to_search) and budget.exhausted_reason == 'max_api_calls':
+            print(f'\n  Limite de chamadas atingido: {len(futures)}/{len(to_search)} buscas feitas.')
+            if not futures:
+                yield snapshot(verbose=True), completeness['searches_done'], searches_planned
+    finally:
+        #cancela o que ainda não começou e não espera buscas penduradas
+        executor.shutdown(wait=False, cancel_futures=True)
+        _abandon_searches(submitted)
+
+    print(f'\nTotal de artistas coletados: {len(all_artists)}')
 
 # %%
 
+
+@profiled
+def expand_artists_from_user_likes(sp: 'spotipy.Spotify',
+                                   user_likes: list[str],
+                                   max_related: int = 20,
+                                   max_per_genre_search: int = 20,
+                                   deadline_s: float = None,
+                                   max_api_calls: int = None):
+    """
+    Expande o universo de artistas a partir das bandas que o usuário gosta,
+    usando a API do Spotify (busca por gênero).
+
+    Consome `iter_expand_artists_from_user_likes` até o fim e devolve só o
+    universo final. Com `deadline_s` e/ou `max_api_calls`, a montagem tem
+    tempo e número de chamadas limitados: ao atingir o limite, devolve o que
+    já foi coletado, e `df.attrs['completeness']` diz o quão completo o
+    universo ficou.
+
+    Retorna:
+        df_with_genres : DataFrame com artistas (likes + relacionados),
+                         já com colunas de gêneros 0/1 prontas para recomendação.
+    """
+    df_with_genres = None
+    for df_with_genres, _, _ in iter_expand_artists_from_user_likes(sp,
+                                                                     user_likes,
+                                                                     max_related=max_related,
+                                                                     max_per_genre_search=max_per_genre_search,
+                                                                     deadline_s=deadline_s,
+                                                                     max_api_calls=max_api_calls):
+        pass
+
+    return df_with_genres
+
+
+# %%
@@ -1,11 +1,9 @@
 #%%
 
-import spotipy
 import numpy as np
 import pandas as pd
-from sklearn.preprocessing import MultiLabelBinarizer
-from sklearn.metrics.pairwise import cosine_similarity
 import ast
+import re
 
 #%%
 
@@ -101,6 +99,8 @@ def collect_seed_artists(sp, seed_artists_names):
     3
 
     """    
+    import spotipy
+
     all_artists = {}
 
     print("\n=== Buscando artistas seed no Spotify ===")
@@ -257,10 +257,149 @@ def _normalize_genres(value):
 
 # %%
 
-def add_genre_vectors(df_artists: pd.DataFrame):
+#lista Python com itens entre aspas simples, ex.: "['metal', 'djent']"
+_QUOTED_ITEM = re.compile(r"'([^'\\]*)'")
+_QUOTED_LIST = re.compile(r"\[\s*(?:'[^'\\]*'\s*(?:,\s*'[^'\\]*'\s*)*,?\s*)?\]")
+
+
+def normalize_genres_bulk(values):
+    """
+    Versão em lote de `_normalize_genres`: normaliza uma coluna 'genres'
+    inteira em uma única passada e monta o vocabulário de gêneros ao mesmo
+    tempo.
+
+    Objetivo da função
+    -------------------
+    Acelerar a ingestão de CSVs grandes (como `data/artists_basic.csv` em
+    escala). Chamar `_normalize_genres` linha a linha paga um
+    `ast.literal_eval`, com try/except, por linha.
+
+    O que esta função faz?
+    -----------------------
+    - Listas → usadas como estão.
+    - Vazios, NaN, "nan" → [].
+    - O formato salvo pelo projeto ("['a', 'b']") é validado e extraído com
+      duas expressões regulares compiladas, sem `ast.literal_eval`.
+    - Strings sem aspas ("[a, b]" ou "a, b") → tira colchetes e divide por vírgula.
+    - Qualquer outro formato (aspas duplas, escapes, texto malformado) cai em
+      `_normalize_genres`, então o resultado é sempre o mesmo da versão por linha.
+    - Cada gênero novo ganha um código no vocabulário na mesma passada; no
+      final, os códigos são renumerados para a ordem alfabética.
+
+    Parâmetros
+    ----------
+    values : iterável (ex.: pandas.Series)
+        Valores da coluna `genres`, em qualquer um dos formatos aceitos por
+        `_normalize_genres`.
+
+    Retorno
+    -------
+    tuple
+        genre_lists : list[list[str]]
+            Lista de gêneros normalizada de cada linha.
+        rows : numpy.ndarray
+            Linha de cada par (linha, gênero).
+        cols : numpy.ndarray
+            Coluna (posição em `classes`) de cada par (linha, gênero).
+        classes : list[str]
+            Vocabulário de gêneros em ordem alfabética.
+
+    Exemplo:
+    --------
+    >>> lists, rows, cols, classes = normalize_genres_bulk(["['metal', 'djent']", "metal"])
+    >>> lists
+    [['metal', 'djent'], ['metal']]
+    >>> classes
+    ['djent', 'metal']
+    """
+    vocab = {}
+    genre_lists = []
+    counts = []
+    codes = []
+
+    quoted_item = _QUOTED_ITEM.findall
+    quoted_list = _QUOTED_LIST.fullmatch
+
+    for value in values:
+        if isinstance(value, list):
+            genres = value
+        elif not isinstance(value, str):
+            genres = _normalize_genres(value)
+        else:
+            text = value.strip()
+            if text == "" or text.lower() == "nan":
+                genres = []
+            elif '"' in text or '\\' in text:
+                genres = _normalize_genres(value)
+            elif "'" in text:
+                if quoted_list(text):
+                    genres = [g.strip() for g in quoted_item(text)]
+                else:
+                    genres = _normalize_genres(value)
+            else:
+                if text.startswith("[") and text.endswith("]"):
+                    text = text[1:-1]
+                genres = [g.strip() for g in text.split(",") if g.strip()]
+
+        genre_lists.append(genres)
+        counts.append(len(genres))
+        for g in genres:
+            code = vocab.get(g)
+            if code is None:
+                code = vocab[g] = len(vocab)
+            codes.append(code)
+
+    classes = sorted(vocab)
+    #código de inserção -> posição alfabética
+    remap = np.empty(len(vocab), dtype=np.intp)
+    remap[[vocab[g] for g in classes]] = np.arange(len(classes))
+
+    rows = np.repeat(np.arange(len(genre_lists)), counts)
+    cols = remap[np.asarray(codes, dtype=np.intp)]
+
+    return genre_lists, rows, cols, classes
+
+# %%
+
+class GenreBinarizer:
+    """
+    Codificador multi-label de gêneros em matriz 0/1, implementado só com NumPy.
+
+    Substitui o `MultiLabelBinarizer` do scikit-learn no caminho de serviço,
+    para que o app não precise importar o scikit-learn (que é lento para
+    carregar). Recebe os pares (linha, coluna) e o vocabulário já calculados
+    por `normalize_genres_bulk`:
+
+    - `fit_codes(n_linhas, rows, cols, classes)` → matriz (n_artistas × n_gêneros)
+    - `classes_` → array com os gêneros em ordem alfabética (uma coluna cada)
+
+    Exemplo:
+    --------
+    >>> lists, rows, cols, classes = normalize_genres_bulk(pd.Series(["['djent', 'metal']", "['metal']"]))
+    >>> b = GenreBinarizer()
+    >>> b.fit_codes(len(lists), rows, cols, classes)
+    array([[1, 1],
+           [0, 1]])
+    >>> b.classes_
+    array(['djent', 'metal'], dtype=object)
+    """
+
+    def fit_codes(self, n_rows: int, rows, cols, classes):
+        """
+        Monta a matriz 0/1 marcando `matrix[rows, cols]` e guarda o vocabulário.
+        """
+        self.classes_ = np.array(classes, dtype=object)
+
+        matrix = np.zeros((n_rows, len(classes)), dtype=int)
+        matrix[rows, cols] = 1
+        return matrix
+
+# %%
+
+def add_genre_vectors(df_artists: pd.DataFrame, verbose: bool = True):
     """
     Converte a coluna 'genres' do DataFrame em vetores numéricos usando
-    MultiLabelBinarizer, criando uma coluna binária para cada gênero encontrado.
+    `GenreBinarizer`, criando uma coluna binária para cada gênero encontrado.
     Retorna um novo DataFrame contendo essas colunas adicionais.
 
     Objetivo da função
@@ -275,28 +414,32 @@ def add_genre_vectors(df_artists: pd.DataFrame):
     O que esta função faz?
     -----------------------
     1) Cria uma cópia do DataFrame original para evitar mutações.
-    2) Normaliza a coluna `genres` usando `_normalize_genres`, garantindo que cada
-       valor seja sempre uma lista de strings.
-    3) Aplica `MultiLabelBinarizer` para transformar as listas em uma matriz 0/1.
+    2) Normaliza a coluna `genres` em lote com `normalize_genres_bulk`, garantindo
+       que cada valor seja sempre uma lista de strings (e já montando o
+       vocabulário de gêneros).
+    3) Aplica `GenreBinarizer` para transformar as listas em uma matriz 0/1.
        - Cada gênero vira uma coluna nova.
        - Cada linha ganha 1 se o artista possui aquele gênero, ou 0 caso contrário.
     4) Concatena o DataFrame original com as novas colunas de gênero.
     5) Retorna:
          - O novo DataFrame com colunas extras
-         - O objeto `MultiLabelBinarizer`, útil para interpretar as classes depois
+         - O objeto `GenreBinarizer`, útil para interpretar as classes depois
 
     Parâmetros
     ----------
     df_artists : pandas.DataFrame
         DataFrame contendo pelo menos a coluna 'genres'. A coluna pode conter listas
         reais ou strings representando listas (como no CSV).
+    verbose : bool, opcional (default=True)
+        Se False, não imprime as mensagens de debug (útil quando a função é
+        chamada várias vezes, como na expansão progressiva do universo).
 
     Retorno
     -------
     tuple
         df_with_genres : pandas.DataFrame
             O DataFrame original acrescido de colunas binárias para cada gênero.
-        mlb : MultiLabelBinarizer
+        mlb : GenreBinarizer
             O codificador treinado, contendo os nomes de todas as classes (gêneros).
 
     Exemplo de funcionamento
@@ -328,17 +471,20 @@ def add_genre_vectors(df_artists: pd.DataFrame):
 
     """
     df = df_artists.copy()
-    df['genres'] = df['genres'].apply(_normalize_genres) 
+    genre_lists, rows, cols, classes = normalize_genres_bulk(df['genres'])
+    df['genres'] = pd.Series(genre_lists, index=df.index, dtype=object)
 
-    print("Exemplos de genres normalizados:")
-    print(df["genres"].head())
+    if verbose:
+        print("Exemplos de genres normalizados:")
+        print(df["genres"].head())
 
-    mlb = MultiLabelBinarizer()
-    genre_matrix = mlb.fit_transform(df['genres'])
+    mlb = GenreBinarizer()
+    genre_matrix = mlb.fit_codes(len(df), rows, cols, classes)
 
-    print(f"\nTotal de gêneros distintos encontrados: {len(mlb.classes_)}")
-    if len(mlb.classes_) > 0:
-        print("Alguns gêneros:", mlb.classes_[:10])
+    if verbose:
+        print(f"\nTotal de gêneros distintos encontrados: {len(mlb.classes_)}")
+        if len(mlb.classes_) > 0:
+            print("Alguns gêneros:", mlb.classes_[:10])
 
     genre_df = pd.DataFrame(
         genre_matrix,
@@ -360,7 +506,7 @@ def get_genre_feature_matrix(df_with_genres: pd.DataFrame):
     Objetivo da função
     -------------------
     Esta função isola somente as colunas binárias geradas pela etapa de 
-    one-hot encoding de gêneros (via MultiLabelBinarizer em `add_genre_vectors`).
+    one-hot encoding de gêneros (via GenreBinarizer em `add_genre_vectors`).
     O resultado é uma matriz adequada para cálculos de similaridade, clustering
     ou entrada em modelos de machine learning.
 
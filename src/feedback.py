@@ -0,0 +1,172 @@
+#%%
+
+import numpy as np
+import pandas as pd
+from src.catalog_index import DEFAULT_GENRE_WEIGHTING, get_catalog_index
+from src.recommender import diversify, find_liked_positions
+from src.scoring import MMR_POOL_SIZE, top_k_indices
+
+#%%
+
+class FeedbackSession:
+    """
+    Sessão de refinamento das recomendações por feedback do usuário
+    ("curti" / "descartar" em artistas recomendados), sem recalcular tudo.
+
+    Objetivo da classe
+    -------------------
+    Evitar que cada ajuste do usuário custe uma nova montagem do universo e um
+    novo score do catálogo inteiro. A sessão guarda o estado do perfil e
+    atualiza só o que a interação muda.
+
+    Estado mantido
+    --------------
+    - `profile_sum` : soma dos vetores de gênero (ponderados por
+      `genre_weighting`) dos artistas curtidos. O cosseno não depende da
+      escala do perfil, então a soma faz o papel da média usada em
+      `recommend_artists_by_genre`.
+    - `profile_sq`  : ||profile_sum||², atualizado em O(nnz) a cada mudança.
+    - `dots`        : produto escalar de cada linha normalizada do catálogo
+      (`CatalogIndex.posting_values`) com `profile_sum`.
+    - `liked` / `dismissed` : máscaras booleanas por linha do catálogo.
+
+    Custo de cada interação
+    -----------------------
+    Curtir (ou descurtir) um artista soma (ou subtrai) a linha dele no perfil.
+    Só os produtos escalares dos artistas que têm algum dos gêneros dessa
+    linha mudam, e eles são encontrados pelas listas invertidas do
+    `CatalogIndex`. O custo é proporcional a essas listas, e não ao catálogo
+    inteiro. Descartar um artista só liga um bit da máscara.
+
+    Exemplo
+    -------
+    >>> session = FeedbackSession(df_with_genres, ['Tool', 'Pallbearer'])
+    >>> session.like(artist_id)
+    >>> session.dismiss(other_id)
+    >>> recs = session.recommend(top_k=15, underground_weight=0.3, max_popularity=50)
+    """
+
+    def __init__(self, df_with_genres: pd.DataFrame, user_likes: list[str], liked_ids: list[str] = None,
+                 genre_weighting: str = DEFAULT_GENRE_WEIGHTING):
+        self.df = df_with_genres
+        self.index = get_catalog_index(df_with_genres)
+        self.genre_weighting = genre_weighting
+        self.weights = self.index.genre_weights(genre_weighting)
+        self.posting_values = self.index.posting_values(genre_weighting)
+
+        n_artists, n_genres = self.index.X.shape
+        self.profile_sum = np.zeros(n_genres)
+        self.profile_sq = 0.0
+        self.dots = np.zeros(n_artists)
+        self.liked = np.zeros(n_artists, dtype=bool)
+        self.dismissed = np.zeros(n_artists, dtype=bool)
+
+        #as bandas informadas entram no perfil como as primeiras curtidas
+        for pos in find_liked_positions(df_with_genres, user_likes, liked_ids):
+            self._update_profile(pos, +1)
+
+    @property
+    def version(self) -> str:
+        return self.index.version
+
+    def _update_profile(self, pos: int, sign: int):
+        """
+        Soma (sign=+1) ou subtrai (sign=-1) a linha `pos` do perfil,
+        atualizando `profile_sq` e `dots` só nos gêneros da linha.
+        """
+        index = self.index
+        genres = np.flatnonzero(index.X[pos])
+        values = index.X[pos, genres] * self.weights[genres] * sign
+
+        #||s + x||² = ||s||² + 2 s·x + ||x||²
+        self.profile_sq += 2 * (self.profile_sum[genres] @ values) + values @ values
+        self.profile_sq = max(self.profile_sq, 0.0)
+        self.profile_sum[genres] += values
+
+        for j, w in zip(genres, values):
+            start, end = index.posting_ptr[j], index.posting_ptr[j + 1]
+            self.dots[index.posting_rows[start:end]] += w * self.posting_values[start:end]
+
+        self.liked[pos] = sign > 0
+
+    def _position(self, artist_id: str):
+        positions = self.index.positions([artist_id])
+        return int(positions[0]) if len(positions) else None
+
+    def like(self, artist_id: str) -> bool:
+        """
+        Adiciona o artista ao perfil. Retorna False se ele não está no
+        catálogo ou já estava curtido.
+        """
+        pos = self._position(artist_id)
+        if pos is None or self.liked[pos]:
+            return False
+
+        self.dismissed[pos] = False
+        self._update_profile(pos, +1)
+        return True
+
+    def unlike(self, artist_id: str) -> bool:
+        """
+        Retira o artista do perfil. Retorna False se ele não estava curtido.
+        """
+        pos = self._position(artist_id)
+        if pos is None or not self.liked[pos]:
+            return False
+
+        self._update_profile(pos, -1)
+        return True
+
+    def dismiss(self, artist_id: str) -> bool:
+        """
+        Tira o artista das recomendações (e do perfil, se estava curtido).
+        """
+        pos = self._position(artist_id)
+        if pos is None:
+            return False
+
+        if self.liked[pos]:
+            self._update_profile(pos, -1)
+        self.dismissed[pos] = True
+        return True
+
+    def liked_ids(self) -> list[str]:
+        return self.index.ids[self.liked].tolist()
+
+    def dismissed_ids(self) -> list[str]:
+        return self.index.ids[self.dismissed].tolist()
+
+    def recommend(self, top_k: int = 20, underground_weight: float = 0.3, max_popularity: int = 54,
+                  diversity: float = 0.0) -> pd.DataFrame:
+        """
+        Recomendações com o perfil atual, no mesmo formato de
+        `recommend_artists_by_genre` (artistas curtidos e descartados ficam
+        de fora).
+
+        Usa os produtos escalares já mantidos pela sessão: nenhum produto
+        matriz × perfil é recalculado aqui. `diversity` liga a reordenação
+        MMR (ver `recommender.diversify`).
+        """
+        if not self.liked.any() or self.profile_sq <= 0:
+            return self.df.iloc[0:0]
+
+        index = self.index
+
+        #candidatos: artistas com algum gênero do perfil, dentro do teto de popularidade
+        candidates = index.candidates(np.flatnonzero(self.profile_sum > 1e-9), max_popularity)
+        candidates = candidates[~(self.liked[candidates] | self.dismissed[candidates])]
+
+        #linhas já normalizadas: só falta dividir pela norma do perfil
+        sims = self.dots[candidates] / np.sqrt(self.profile_sq)
+
+        pop_norm = index.popularity[candidates] / (index.max_popularity or 1)
+        final_score = (1.0 - underground_weight) * sims + underground_weight * (1 - pop_norm)
+
+        pool_size = max(top_k, MMR_POOL_SIZE) if diversity > 0 else top_k
+        keep = top_k_indices(final_score, pool_size)
+        keep = keep[np.argsort(-final_score[keep], kind='stable')]
+
+        return diversify(self.df, index, candidates[keep], sims[keep], pop_norm[keep], final_score[keep],
+                         top_k, diversity, self.genre_weighting)
+
+# %%
@@ -0,0 +1,217 @@
+#%%
+
+import argparse
+import contextlib
+import io
+import itertools
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.abspath(".."))
+
+import numpy as np
+import pandas as pd
+from src import metrics
+from src.cache.cache_db import use_cache_db
+from src.cassette import CASSETTE_PATH, ReplaySpotify
+from src.dataset import expand_artists_from_user_likes, wait_for_abandoned_searches
+from src.name_index import ARTISTS_CSV_PATH, reset_name_index
+from src.recommender import recommend_artists_by_genre
+
+#%%
+
+def default_seed_lists(n_lists: int = 20, per_list: int = 2, seed: int = 0) -> list[list[str]]:
+    """
+    Gera listas de bandas para a simulação a partir de `data/artists_basic.csv`
+    (combinações aleatórias de `per_list` bandas).
+    """
+    names = pd.read_csv(ARTISTS_CSV_PATH)['name'].tolist()
+    rnd = random.Random(seed)
+    return [rnd.sample(names, min(per_list, len(names))) for _ in range(n_lists)]
+
+# %%
+
+@contextlib.contextmanager
+def isolated_caches():
+    """
+    Roda o bloco `with` sobre um banco de cache temporário e um índice de
+    nomes novo (só o CSV), descartados no fim.
+
+    No modo replay, cada chamada fora do cassete volta vazia; sem isso, esses
+    vazios iriam para o `data/cache.db` do app como artistas inexistentes, e
+    as rodadas seguintes mediriam acertos de cache em vez do fluxo completo.
+
+    Buscas abandonadas por tempo limite (`--deadline`) ainda gravam nos
+    caches ao terminar: o bloco só sai depois delas.
+    """
+    with tempfile.TemporaryDirectory(prefix='loadtest-') as tmp:
+        with use_cache_db(os.path.join(tmp, 'cache.db')):
+            reset_name_index()
+            try:
+                yield
+            finally:
+                wait_for_abandoned_searches()
+                reset_name_index()
+
+
+def simulate_request(sp, user_likes: list[str], top_k: int = 15, underground_weight: float = 0.3,
+                     deadline_s: float = None, max_api_calls: int = None):
+    """
+    Executa o mesmo fluxo do `app_streamlit.py` em um pedido sem cache:
+    montagem do universo + recomendação.
+    """
+    df_with_genres = expand_artists_from_user_likes(sp,
+                                                    user_likes=user_likes,
+                                                    deadline_s=deadline_s,
+                                                    max_api_calls=max_api_calls)
+    if df_with_genres.empty:
+        return df_with_genres
+    return recommend_artists_by_genre(df_with_genres, user_likes, top_k, underground_weight)
+
+
+def run_load_test(sp, seed_lists: list[list[str]], n_users: int = 4, requests_per_user: int = 5,
+                  think_time: float = 0.0, **request_kwargs) -> dict:
+    """
+    Simula `n_users` usuários concorrentes usando o app.
+
+    Objetivo da função
+    -------------------
+    Encontrar limites de escala offline: cada usuário é uma thread que faz
+    `requests_per_user` pedidos em sequência (bandas sorteadas de `seed_lists`),
+    esperando `think_time` segundos entre eles. Com um `ReplaySpotify`, nada
+    vai para a rede e a latência da API é a gravada no cassete.
+
+    Retorno
+    -------
+    dict
+        Relatório com:
+            - requests, errors
+            - wall_s            : duração total
+            - throughput_rps    : pedidos concluídos por segundo
+            - latency_ms        : p50, p90, p95, p99 e max
+            - api_calls         : chamadas à API durante o teste
+            - api_calls_per_request
+    """
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    seed_cycle = itertools.cycle(seed_lists)
+
+    def user_session(user_id):
+        for _ in range(requests_per_user):
+            with lock:
+                user_likes = next(seed_cycle)
+
+            start = time.perf_counter()
+            try:
+                simulate_request(sp, user_likes, **request_kwargs)
+            except Exception as e:
+                with lock:
+                    errors.append(repr(e))
+                continue
+            finally:
+                elapsed = time.perf_counter() - start
+
+            with lock:
+                latencies.append(elapsed)
+
+            if think_time:
+                time.sleep(think_time)
+
+    calls_before = metrics.get('spotify.api_calls')
+    start = time.perf_counter()
+
+    #os logs do pipeline não fazem sentido com vários usuários ao mesmo tempo
+    with contextlib.redirect_stdout(io.StringIO()):
+        with ThreadPoolExecutor(max_workers=n_users) as executor:
+            list(executor.map(user_session, range(n_users)))
+
+    wall = time.perf_counter() - start
+    api_calls = metrics.get('spotify.api_calls') - calls_before
+    total = len(latencies) + len(errors)
+
+    lat_ms = np.array(latencies) * 1000 if latencies else np.zeros(1)
+    return {
+        'users': n_users,
+        'requests': total,
+        'errors': len(errors),
+        'wall_s': round(wall, 3),
+        'throughput_rps': round(len(latencies) / wall, 2) if wall else 0.0,
+        'latency_ms': {
+            'p50': round(float(np.percentile(lat_ms, 50)), 1),
+            'p90': round(float(np.percentile(lat_ms, 90)), 1),
+            'p95': round(float(np.percentile(lat_ms, 95)), 1),
+            'p99': round(float(np.percentile(lat_ms, 99)), 1),
+            'max': round(float(lat_ms.max()), 1),
+        },
+        'api_calls': int(api_calls),
+        'api_calls_per_request': round(api_calls / total, 2) if total else 0.0,
+        'first_errors': errors[:5],
+    }
+
+
+def print_report(report: dict):
+    lat = report['latency_ms']
+    print(f"\n=== Usuários concorrentes: {report['users']} ===")
+    print(f"Pedidos: {report['requests']} (erros: {report['errors']}) em {report['wall_s']}s")
+    print(f"Vazão: {report['throughput_rps']} pedidos/s")
+    print(f"Latência (ms): p50={lat['p50']} p90={lat['p90']} p95={lat['p95']} "
+          f"p99={lat['p99']} max={lat['max']}")
+    print(f"Chamadas à API: {report['api_calls']} ({report['api_calls_per_request']} por pedido)")
+    for e in report['first_errors']:
+        print(f"  erro: {e}")
+
+# %%
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Teste de carga do fluxo do app (universo + recomendação) com usuários concorrentes.')
+    parser.add_argument('--users', type=int, nargs='+', default=[1, 4, 16],
+                        help='Quantidades de usuários concorrentes a simular (uma rodada por valor).')
+    parser.add_argument('--requests', type=int, default=5, help='Pedidos por usuário.')
+    parser.add_argument('--think-time', type=float, default=0.0, help='Pausa entre pedidos (s).')
+    parser.add_argument('--seeds', action='append',
+                        help='Lista de bandas separadas por vírgula (pode repetir). '
+                             'Default: combinações de data/artists_basic.csv.')
+    parser.add_argument('--cassette', default=str(CASSETTE_PATH), help='Cassete para o modo replay.')
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help='Multiplicador da latência gravada (0 = sem espera).')
+    parser.add_argument('--live', action='store_true',
+                        help='Usa a API real (get_spotify_client) em vez do cassete.')
+    parser.add_argument('--deadline', type=float, default=None, help='deadline_s de cada pedido.')
+    parser.add_argument('--max-api-calls', type=int, default=None, help='max_api_calls de cada pedido.')
+    args = parser.parse_args(argv)
+
+    if args.seeds:
+        seed_lists = [[b.strip() for b in s.split(',') if b.strip()] for s in args.seeds]
+    else:
+        seed_lists = default_seed_lists()
+
+    if args.live:
+        from src.spotify_client import get_spotify_client
+        sp = get_spotify_client()
+    else:
+        sp = ReplaySpotify(args.cassette, speed=args.speed, on_miss='empty')
+
+    for n_users in args.users:
+        #replay: cada rodada começa com caches vazios e não toca os do app
+        isolation = contextlib.nullcontext() if args.live else isolated_caches()
+        with isolation:
+            report = run_load_test(sp, seed_lists,
+                                   n_users=n_users,
+                                   requests_per_user=args.requests,
+                                   think_time=args.think_time,
+                                   deadline_s=args.deadline,
+                                   max_api_calls=args.max_api_calls)
+        print_report(report)
+
+
+if __name__ == '__main__':
+    main()
+
+# %%
@@ -0,0 +1,45 @@
+#%%
+
+import threading
+from collections import defaultdict
+
+#%%
+
+_counters = defaultdict(float)
+_lock = threading.Lock()
+
+# %%
+
+def incr(name: str, value: float = 1):
+    """
+    Soma `value` ao contador `name` (ex.: 'spotify.api_calls').
+    Seguro para uso concorrente.
+    """
+    with _lock:
+        _counters[name] += value
+
+
+def get(name: str) -> float:
+    """
+    Valor atual do contador `name` (0 se nunca foi incrementado).
+    """
+    with _lock:
+        return _counters.get(name, 0)
+
+
+def snapshot() -> dict:
+    """
+    Cópia de todos os contadores no momento da chamada.
+    """
+    with _lock:
+        return dict(_counters)
+
+
+def reset():
+    """
+    Zera todos os contadores.
+    """
+    with _lock:
+        _counters.clear()
+
+# %%
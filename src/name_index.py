@@ -0,0 +1,280 @@
+#%%
+
+import os
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+
+import pandas as pd
+from src.cache.cache_db import ARTIST_TTL, get_artist_cache, get_negative_cache, project_artist
+from src.features import get_artist_by_name, normalize_genres_bulk
+
+#%%
+
+ARTISTS_CSV_PATH = Path(__file__).resolve().parent.parent / 'data' / 'artists_basic.csv'
+
+#nomes resolvidos pela API guardados no índice (mesmo tamanho do cache de artistas)
+LEARNED_MAX = 4096
+
+# %%
+
+def normalize_name(name) -> str:
+    """
+    Normaliza um nome de artista para comparação.
+
+    - Remove acentos e outros diacríticos ("Motörhead" → "motorhead").
+    - Usa `casefold` (minúsculas agressivas: "TOOL" → "tool").
+    - Remove espaços nas pontas e colapsa espaços repetidos.
+
+    Exemplo:
+    --------
+    >>> normalize_name("  Dir  en Grey ")
+    'dir en grey'
+    """
+    if not isinstance(name, str):
+        return ''
+    text = unicodedata.normalize('NFKD', name)
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    return ' '.join(text.casefold().split())
+
+# %%
+
+class ArtistNameIndex:
+    """
+    Índice local de resolução de nomes de artistas.
+
+    Objetivo da classe
+    -------------------
+    Evitar ida à API do Spotify (`sp.search`) para artistas que já conhecemos.
+    O índice mapeia nomes normalizados (e apelidos/aliases, como o texto que
+    o usuário digitou) para o `id` do artista, e guarda os dados do artista
+    no mesmo formato retornado pela API:
+
+        {
+            'id': str,
+            'name': str,
+            'popularity': int,
+            'genres': list[str],
+            'external_urls': {'spotify': str}
+        }
+
+    O que esta classe faz?
+    -----------------------
+    - `add(artist, aliases)`: registra um artista do catálogo (CSV, snapshot)
+      pelo nome e por apelidos. Essas entradas não expiram.
+    - `learn(artist, aliases)`: registra o artista que a API devolveu para um
+      nome (`resolve_artist`). Essas entradas valem por `learned_ttl` segundos
+      e no máximo `max_learned` nomes ficam guardados (descarte LRU).
+    - `add_alias(alias, artist_id)`: registra um apelido para um artista do catálogo.
+    - `lookup(name)`: devolve os dados do artista, ou None se o nome for desconhecido.
+    - `resolve_id(name)`: devolve só o `id`, ou None.
+
+    Só artistas do catálogo e nomes resolvidos pela própria busca por nome
+    entram no índice: artistas que só apareceram em buscas por gênero não são
+    registrados, para que um homônimo não tome o lugar do artista que
+    `sp.search(limit=1)` devolveria. Entre artistas do catálogo, o primeiro
+    registrado para um nome é mantido, e o catálogo vale mais que a API.
+    """
+
+    def __init__(self, max_learned: int = LEARNED_MAX, learned_ttl: float = ARTIST_TTL):
+        self.max_learned = max_learned
+        self.learned_ttl = learned_ttl
+        self._ids = {}
+        self._artists = {}
+        #nome normalizado → (artista, momento do registro), em ordem de uso
+        self._learned = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, artist: dict, aliases=()):
+        artist_id = artist['id']
+        #guarda só os campos usados pelo pipeline, não o payload inteiro da API
+        artist = project_artist(artist)
+        with self._lock:
+            self._artists[artist_id] = artist
+            for name in (artist['name'], *aliases):
+                key = normalize_name(name)
+                if key:
+                    self._ids.setdefault(key, artist_id)
+
+    def add_alias(self, alias: str, artist_id: str):
+        key = normalize_name(alias)
+        with self._lock:
+            if key and artist_id in self._artists:
+                self._ids[key] = artist_id
+
+    def learn(self, artist: dict, aliases=()):
+        artist = project_artist(artist)
+        now = time.time()
+        with self._lock:
+            for name in (artist['name'], *aliases):
+                key = normalize_name(name)
+                if key and key not in self._ids:
+                    self._learned[key] = (artist, now)
+                    self._learned.move_to_end(key)
+            while len(self._learned) > self.max_learned:
+                self._learned.popitem(last=False)
+
+    def lookup(self, name: str):
+        key = normalize_name(name)
+        with self._lock:
+            artist_id = self._ids.get(key)
+            if artist_id is not None:
+                return self._artists.get(artist_id)
+
+            entry = self._learned.get(key)
+            if entry is None:
+                return None
+            artist, learned_at = entry
+            if time.time() - learned_at > self.learned_ttl:
+                del self._learned[key]
+                return None
+            self._learned.move_to_end(key)
+            return artist
+
+    def resolve_id(self, name: str):
+        artist = self.lookup(name)
+        return None if artist is None else artist['id']
+
+    def __len__(self):
+        return len(self._artists)
+
+    def __contains__(self, name):
+        return self.resolve_id(name) is not None
+
+    @classmethod
+    def from_dataframe(cls, df_artists: pd.DataFrame):
+        """
+        Cria um índice a partir de um DataFrame com as colunas base
+        (id, name, popularity, genres, spotify_url), como o `data/artists_basic.csv`.
+        """
+        index = cls()
+        genre_lists = normalize_genres_bulk(df_artists['genres'])[0]
+        for row, genres in zip(df_artists[['id', 'name', 'popularity', 'spotify_url']].itertuples(index=False),
+                               genre_lists):
+            index.add({
+                'id': row.id,
+                'name': row.name,
+                'popularity': int(row.popularity),
+                'genres': genres,
+                'external_urls': {'spotify': row.spotify_url},
+            })
+        return index
+
+# %%
+
+_default_index = None
+_default_index_lock = threading.Lock()
+
+
+def get_name_index() -> ArtistNameIndex:
+    """
+    Retorna o índice de nomes compartilhado pelo processo.
+
+    Na primeira chamada, o índice é construído a partir de `data/artists_basic.csv`
+    (se existir). Depois disso, recebe os snapshots do catálogo e os nomes
+    resolvidos pela API (`resolve_artist`, com validade e tamanho limitados).
+    """
+    global _default_index
+    if _default_index is None:
+        with _default_index_lock:
+            if _default_index is None:
+                if os.path.exists(ARTISTS_CSV_PATH):
+                    _default_index = ArtistNameIndex.from_dataframe(pd.read_csv(ARTISTS_CSV_PATH))
+                else:
+                    _default_index = ArtistNameIndex()
+    return _default_index
+
+
+def reset_name_index():
+    """
+    Descarta o índice de nomes do processo: a próxima chamada a
+    `get_name_index` o reconstrói só a partir do CSV.
+    """
+    global _default_index
+    with _default_index_lock:
+        _default_index = None
+
+# %%
+
+def is_known_missing(name: str) -> bool:
+    """
+    True se uma busca recente por esse nome não encontrou nenhum artista
+    (ver `get_negative_cache`).
+    """
+    return get_negative_cache().get(f'artist:{normalize_name(name)}') is not None
+
+
+def find_artist(name: str, name_index: ArtistNameIndex = None):
+    """
+    Procura um artista só localmente, sem chamada de rede: no índice de nomes
+    e, se não estiver lá, no cache de artistas (memória + SQLite, ver
+    `src.cache.cache_db`), compartilhado entre processos e reinícios.
+
+    Retorna os dados do artista ou None. Um artista achado no cache é
+    registrado no índice (`learn`), com o texto digitado como apelido.
+    """
+    if name_index is None:
+        name_index = get_name_index()
+
+    artist = name_index.lookup(name)
+    if artist is not None:
+        return artist
+
+    artist = get_artist_cache().get(normalize_name(name))
+    if artist is not None:
+        name_index.learn(artist, aliases=(name,))
+    return artist
+
+
+def resolve_artist(sp, name: str, name_index: ArtistNameIndex = None):
+    """
+    Resolve o nome de um artista, consultando primeiro o índice local.
+
+    Parâmetros
+    ----------
+    sp : spotipy.Spotify
+        Cliente autenticado, usado só quando o nome não está no índice.
+    name : str
+        Nome digitado pelo usuário.
+    name_index : ArtistNameIndex, opcional
+        Índice a consultar. Por padrão usa `get_name_index()`.
+
+    Retorno
+    -------
+    dict ou None
+        Dados do artista (formato da API do Spotify) ou None.
+
+    O que essa função faz?
+    -----------------------
+    - Procura o artista localmente (`find_artist`): índice de nomes e cache
+      de artistas, sem nenhuma chamada de rede.
+    - Nomes que a API já respondeu como inexistentes (cache negativo, validade
+      curta) devolvem None sem chamada de rede.
+    - Por último, usa `get_artist_by_name` e grava o resultado no cache
+      (ou, se não encontrar nada, no cache negativo).
+    - O artista encontrado é registrado no índice (`learn`), com o texto
+      digitado como apelido, para que a próxima busca seja local.
+    """
+    if name_index is None:
+        name_index = get_name_index()
+
+    artist = find_artist(name, name_index)
+    if artist is not None:
+        return artist
+
+    if is_known_missing(name):
+        return None
+
+    key = normalize_name(name)
+    artist = get_artist_by_name(sp, name)
+    if artist is None:
+        get_negative_cache().set(f'artist:{key}', True)
+        return None
+
+    get_artist_cache().set(key, artist)
+    name_index.learn(artist, aliases=(name,))
+    return artist
+
+# %%
@@ -0,0 +1,237 @@
+#%%
+
+import cProfile
+import functools
+import io
+import os
+import pstats
+import re
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+
+#%%
+
+PROFILE_DIR = Path(__file__).resolve().parent.parent / 'data' / 'profiles'
+
+#RECOMMENDER_PROFILE=1 liga o perfil de cada chamada aos pontos de entrada
+PROFILE_ENV = 'RECOMMENDER_PROFILE'
+
+#funções do pipeline = definidas em arquivos dentro de src/
+SRC_DIR = str(Path(__file__).resolve().parent)
+
+#linhas de cada seção do relatório
+TOP_FUNCTIONS = 30
+TOP_ALLOCATIONS = 15
+
+_enabled = os.getenv(PROFILE_ENV, '').lower() in ('1', 'true', 'yes')
+
+#cProfile e tracemalloc medem o processo inteiro: um perfil por vez
+_profile_lock = threading.Lock()
+
+# %%
+
+def enable():
+    """
+    Liga o perfil automático dos pontos de entrada marcados com `@profiled`.
+    """
+    global _enabled
+    _enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+# %%
+
+class ProfileReport:
+    """
+    Resultado do perfil de um pedido.
+
+    Atributos
+    ---------
+    label : str
+        Nome do pedido (ex.: as bandas informadas).
+    elapsed_s : float
+        Tempo total do pedido.
+    peak_bytes : int
+        Pico de memória alocada durante o pedido (tracemalloc).
+    text : str
+        Relatório em texto (ver `format_report`).
+    stats_path, report_path : Path
+        Perfil bruto do cProfile (`.prof`, abre no snakeviz ou em outro
+        visualizador de flame graph / icicle) e o relatório em texto.
+    """
+
+    def __init__(self, label, elapsed_s, peak_bytes, text, stats_path, report_path):
+        self.label = label
+        self.elapsed_s = elapsed_s
+        self.peak_bytes = peak_bytes
+        self.text = text
+        self.stats_path = stats_path
+        self.report_path = report_path
+
+    def __str__(self):
+        return self.text
+
+
+def pipeline_functions(stats: pstats.Stats, limit: int = TOP_FUNCTIONS) -> list[dict]:
+    """
+    Funções definidas em src/ com chamadas, tempo próprio e tempo acumulado,
+    em ordem decrescente de tempo acumulado.
+    """
+    rows = []
+    for (filename, line, name), (_, ncalls, tottime, cumtime, _) in stats.stats.items():
+        if not filename.startswith(SRC_DIR) or filename == __file__:
+            continue
+        module = os.path.relpath(filename, os.path.dirname(SRC_DIR)).replace(os.sep, '.')[:-3]
+        rows.append({'function': f'{module}.{name}', 'line': line, 'ncalls': ncalls,
+                     'tottime': tottime, 'cumtime': cumtime})
+    rows.sort(key=lambda r: r['cumtime'], reverse=True)
+    return rows[:limit]
+
+
+def format_report(label: str, elapsed_s: float, peak_bytes: int, stats: pstats.Stats,
+                  allocations: list) -> str:
+    """
+    Monta o relatório em texto:
+
+    1) funções do pipeline (src/) por tempo acumulado;
+    2) todas as funções (inclusive pandas, spotipy, rede) por tempo acumulado;
+    3) linhas de código com mais memória alocada ainda viva no fim do pedido.
+    """
+    lines = [f'Perfil do pedido: {label}',
+             f'Tempo total: {elapsed_s:.3f} s | pico de memória: {peak_bytes / 2**20:.1f} MiB',
+             '',
+             'Funções do pipeline (src/), por tempo acumulado',
+             f'{"chamadas":>10}{"próprio (s)":>14}{"acumulado (s)":>16}  função']
+    for row in pipeline_functions(stats):
+        lines.append(f"{row['ncalls']:>10}{row['tottime']:>14.4f}{row['cumtime']:>16.4f}  "
+                     f"{row['function']} (linha {row['line']})")
+
+    stream = io.StringIO()
+    stats.stream = stream
+    stats.sort_stats('cumulative').print_stats(TOP_FUNCTIONS)
+    #remove o cabeçalho do pstats (caminho do arquivo e data)
+    full = stream.getvalue()
+    full = full[full.find('ncalls') - 3:] if 'ncalls' in full else full
+
+    lines += ['', 'Todas as funções, por tempo acumulado', full.rstrip(), '',
+              'Memória alocada (viva no fim do pedido), por linha',
+              f'{"KiB":>10}{"blocos":>10}  linha']
+    for stat in allocations:
+        frame = stat.traceback[0]
+        lines.append(f'{stat.size / 1024:>10.1f}{stat.count:>10}  {frame.filename}:{frame.lineno}')
+
+    return '\n'.join(lines) + '\n'
+
+
+def _slug(label: str) -> str:
+    return re.sub(r'[^a-z0-9]+', '-', label.lower()).strip('-')[:40] or 'pedido'
+
+# %%
+
+class _Profile:
+    """
+    Estado de um perfil em andamento (preenchido por `profile_request`).
+    """
+
+    def __init__(self):
+        self.report = None
+
+
+@contextmanager
+def profile_request(label: str = 'pedido', enabled: bool = None, directory=PROFILE_DIR):
+    """
+    Perfila o bloco `with` (um pedido): perfil de CPU (cProfile) e de
+    alocações (tracemalloc).
+
+    Objetivo da função
+    -------------------
+    Descobrir para onde vai o tempo de um pedido lento: chamadas à API,
+    normalização de gêneros, montagem da matriz, score etc.
+
+    O que esta função faz?
+    -----------------------
+    - Com `enabled` falso (default: `is_enabled()`), não faz nada: o custo
+      é o de entrar e sair de um `with`.
+    - Senão, liga o cProfile e o tracemalloc, executa o bloco e grava em
+      `directory` o perfil bruto (`.prof`) e o relatório (`.txt`).
+    - O relatório fica em `prof.report` (`ProfileReport`) e é impresso.
+    - Perfis não se aninham nem rodam em paralelo: se já há um perfil em
+      andamento (neste ou em outro pedido), o bloco roda sem perfil.
+
+    Observação: o cProfile mede só a thread que abriu o perfil. O tempo das
+    buscas feitas no pool de threads (`iter_expand_artists_from_user_likes`)
+    aparece como espera nessa thread.
+
+    Exemplo
+    -------
+    >>> with profile_request('Gojira, Mastodon', enabled=True) as prof:
+    ...     recs = recommend_artists_by_genre(df_with_genres, ['Gojira', 'Mastodon'])
+    >>> print(prof.report.report_path)
+    """
+    prof = _Profile()
+    if enabled is None:
+        enabled = _enabled
+
+    if not enabled or not _profile_lock.acquire(blocking=False):
+        yield prof
+        return
+
+    try:
+        already_tracing = tracemalloc.is_tracing()
+        if not already_tracing:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        profiler = cProfile.Profile()
+
+        start = time.perf_counter()
+        profiler.enable()
+        try:
+            yield prof
+        finally:
+            profiler.disable()
+            elapsed = time.perf_counter() - start
+            _, peak = tracemalloc.get_traced_memory()
+            allocations = tracemalloc.take_snapshot().statistics('lineno')[:TOP_ALLOCATIONS]
+            if not already_tracing:
+                tracemalloc.stop()
+
+            directory = Path(directory)
+            directory.mkdir(parents=True, exist_ok=True)
+            base = directory / f"{time.strftime('%Y%m%d-%H%M%S')}-{_slug(label)}"
+            stats_path, report_path = base.with_suffix('.prof'), base.with_suffix('.txt')
+
+            profiler.dump_stats(stats_path)
+            text = format_report(label, elapsed, peak, pstats.Stats(profiler), allocations)
+            report_path.write_text(text, encoding='utf-8')
+
+            prof.report = ProfileReport(label, elapsed, peak, text, stats_path, report_path)
+            print(f'Perfil gravado em {report_path} ({elapsed:.3f} s)')
+    finally:
+        _profile_lock.release()
+
+
+def profiled(fn):
+    """
+    Marca um ponto de entrada da biblioteca: com o perfil ligado (`enable()`
+    ou RECOMMENDER_PROFILE=1), cada chamada gera um relatório. Desligado,
+    o custo é uma checagem de variável por chamada.
+    """
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        if not _enabled:
+            return fn(*args, **kwargs)
+        with profile_request(fn.__name__):
+            return fn(*args, **kwargs)
+    return wrapper
+
+# %%
@@ -7,15 +7,100 @@ sys.path.append(os.path.abspath(".."))
 
 import pandas as pd
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
-from src.features import get_genre_feature_matrix, BASE_COLS
+from src.catalog_index import DEFAULT_GENRE_WEIGHTING, get_catalog_index
+from src.name_index import get_name_index, normalize_name
+from src.profiling import profiled
+from src.scoring import MMR_POOL_SIZE, mmr_rerank, score_top_k
 
 # %%
 
+def find_liked_positions(df_with_genres: pd.DataFrame,
+                         user_likes: list[str],
+                         liked_ids: list[str] = None) -> np.ndarray:
+    """
+    Localiza as linhas (posições) das bandas que o usuário gosta, por `id`.
+
+    Ordem de resolução de cada nome:
+    1) `liked_ids`, se informado explicitamente;
+    2) `df.attrs['seed_ids']` (nome normalizado → id), gravado por
+       `expand_artists_from_user_likes`;
+    3) índice local de nomes (`get_name_index`), que conhece apelidos
+       ("TOOL", "tool" e "Tool" resolvem para o mesmo id).
+
+    Os ids são convertidos em posições com uma busca no índice de ids do
+    catálogo (hash, construído uma vez por versão), sem varrer a coluna de nomes. Só se algum nome continuar
+    sem resolução é feita uma comparação por nome normalizado, como último recurso.
+    """
+    if liked_ids is None:
+        seed_ids = df_with_genres.attrs.get('seed_ids', {})
+        name_index = get_name_index()
+        liked_ids = []
+        unresolved = []
+        for name in user_likes:
+            artist_id = seed_ids.get(normalize_name(name)) or name_index.resolve_id(name)
+            if artist_id is None:
+                unresolved.append(name)
+            else:
+                liked_ids.append(artist_id)
+    else:
+        unresolved = []
+
+    positions = get_catalog_index(df_with_genres).positions(liked_ids)
+
+    if unresolved:
+        wanted = {normalize_name(n) for n in unresolved}
+        by_name = np.flatnonzero([normalize_name(n) in wanted for n in df_with_genres['name']])
+        positions = np.concatenate([positions, by_name])
+
+    return np.unique(positions)
+
+# %%
+
+def build_scores_frame(df_with_genres: pd.DataFrame, rows, sims, pop_norm, final_score) -> pd.DataFrame:
+    """
+    Monta o DataFrame de saída das recomendações: as linhas `rows` do catálogo
+    (já ordenadas) mais as colunas similarity, pop_norm, underground_score e
+    final_score. Só as linhas do top_k são copiadas.
+    """
+    df_scores = df_with_genres.iloc[rows].copy()
+    df_scores['similarity'] = sims
+    df_scores['pop_norm'] = pop_norm
+    df_scores['underground_score'] = 1 - pop_norm
+    df_scores['final_score'] = final_score
+
+    return df_scores
+
+# %%
+
+def diversify(df_with_genres: pd.DataFrame, index, rows, sims, pop_norm, final_score,
+              top_k: int, diversity: float = 0.0,
+              genre_weighting: str = DEFAULT_GENRE_WEIGHTING) -> pd.DataFrame:
+    """
+    Escolhe o top_k final dentre os candidatos já pontuados (ordenados por
+    `final_score`) e monta o DataFrame de saída.
+
+    Com `diversity > 0`, a escolha usa `mmr_rerank` sobre os vetores de
+    gênero dos candidatos (com a mesma ponderação do score, via
+    `index.genre_vectors`); com 0, mantém os `top_k` primeiros.
+    """
+    if diversity > 0 and len(rows) > 0:
+        order = mmr_rerank(index.genre_vectors(rows, genre_weighting), final_score, top_k, diversity)
+    else:
+        order = np.arange(min(top_k, len(rows)))
+
+    return build_scores_frame(df_with_genres, rows[order], sims[order], pop_norm[order], final_score[order])
+
+# %%
+
+@profiled
 def recommend_artists_by_genre(df_with_genres: pd.DataFrame,
                                user_likes: list[str],
                                top_k: int = 20,
-                               underground_weight: float = 0.3):
+                               underground_weight: float = 0.3,
+                               liked_ids: list[str] = None,
+                               max_popularity: int = 54,
+                               diversity: float = 0.0,
+                               genre_weighting: str = DEFAULT_GENRE_WEIGHTING):
     """
     Gera recomendações de artistas com base em gêneros musicais e popularidade inversa.
 
@@ -37,6 +122,35 @@ def recommend_artists_by_genre(df_with_genres: pd.DataFrame,
         - 0.3  → mistura 70% similaridade + 30% “quanto menos popular, melhor”
         - 1.0  → só “quanto menos popular, melhor” (não recomendado)
 
+    liked_ids : list[str], opcional
+        Ids do Spotify das bandas informadas. Se omitido, os ids são resolvidos
+        a partir dos nomes (ver `find_liked_positions`).
+
+    max_popularity : int ou None, opcional (default=54)
+        Popularidade máxima dos artistas recomendados. None = sem teto.
+        O teto é aplicado antes do cálculo de similaridade: os candidatos vêm
+        das listas por gênero ordenadas por popularidade (`CatalogIndex`),
+        então o custo do score é proporcional só aos candidatos que sobram,
+        e o top_k é sempre escolhido entre artistas que respeitam o teto.
+
+    diversity : float, opcional (default=0.0)
+        Peso da diversidade na reordenação final (MMR, ver `diversify`).
+        0 = desligado; valores maiores evitam listas com artistas de gêneros
+        quase idênticos.
+
+    genre_weighting : str, opcional (default='idf')
+        Ponderação dos gêneros no cosseno (ver `CatalogIndex.genre_weights`).
+        - 'idf'    → gêneros comuns no catálogo (ex.: "metal") pesam menos que
+                     gêneros raros, que dizem mais sobre o gosto do usuário
+        - 'binary' → todos os gêneros pesam igual (matriz 0/1)
+        As linhas ponderadas e normalizadas são calculadas uma vez por versão
+        do catálogo, então o cosseno de cada candidato é só um produto
+        escalar esparso com o perfil.
+
+    O score dos candidatos é feito em blocos por um pool de threads
+    (`src.scoring.score_top_k`), e só o top_k de cada bloco é guardado, então
+    a memória não cresce com o tamanho do catálogo.
+
     Retorno
     -------
     pandas.DataFrame
@@ -52,56 +166,40 @@ def recommend_artists_by_genre(df_with_genres: pd.DataFrame,
         print('DataFrame vazio, nada para recomendar')
         return df_with_genres
     
-    #normalizar nomes de entrada
-    user_likes_lower = [n.lower().strip() for n in user_likes]
-
-    #selecionar linhas dos artistas que o usuário gosta
-    liked_rows = df_with_genres[df_with_genres['name'].str.lower().isin(user_likes_lower)]
+    #selecionar linhas dos artistas que o usuário gosta (busca por id)
+    liked_pos = find_liked_positions(df_with_genres, user_likes, liked_ids)
 
-    if liked_rows.empty:
+    if len(liked_pos) == 0:
         print('Nenhuma das bandas informadas foi encontrada no dataset')
         return df_with_genres.iloc[0:0]
     
-    #matriz de features de generos e nomes das cols de genero
-    X, genre_cols = get_genre_feature_matrix(df_with_genres)
+    #estruturas do catálogo (matriz, popularidade, listas por gênero),
+    #calculadas uma vez por versão do catálogo
+    index = get_catalog_index(df_with_genres)
+    X = index.X
 
-    #vetor de perfil do usuário: média dos vetores de genero das bandas liked
-    user_profile = liked_rows[genre_cols].values.mean(axis=0, keepdims=True)
+    #vetor de perfil do usuário: média dos vetores de genero das bandas liked,
+    #na mesma ponderação das linhas do catálogo
+    user_profile = X[liked_pos].mean(axis=0, keepdims=True) * index.genre_weights(genre_weighting)
 
-    #similaridade de cosseno entre perfil e todos os artistas
-    sims = cosine_similarity(user_profile, X)[0]
-
-    df_scores = df_with_genres.copy()
-    df_scores['similarity'] = sims
-
-    #normalizar popularidade para 0, 1
-    max_pop = df_scores['popularity'].max() or 1
-    df_scores['pop_norm'] = df_scores['popularity'] / max_pop
-
-    #fator underground
-    df_scores['underground_score'] = 1 - df_scores['pop_norm']
-
-    #score final: similaridade + underground
-    w_sim = 1.0 - underground_weight
-    w_und = underground_weight
-
-    df_scores['final_score'] = (
-        w_sim * df_scores['similarity'] + w_und * df_scores['underground_score']
-    )
-
-    #remover bandas com popularidade acima de 50
-    df_scores = df_scores[df_scores['popularity'] <= 54]
-
-    #remover bandas sem similaridade
-    df_scores = df_scores[df_scores['similarity'] > 0]
+    #candidatos: artistas que dividem ao menos um gênero com o perfil
+    #(similaridade > 0) e respeitam o teto de popularidade
+    candidates = index.candidates(np.flatnonzero(user_profile[0]), max_popularity)
 
     #remover bandas que o usuário ja informou
-    df_scores = df_scores[~df_scores['name'].str.lower().isin(user_likes_lower)]
+    candidates = candidates[~np.isin(candidates, liked_pos)]
+
+    #com diversidade, o MMR escolhe o top_k dentre um conjunto maior de candidatos
+    pool_size = max(top_k, MMR_POOL_SIZE) if diversity > 0 else top_k
 
-    #ordenar por score final e limitar ao top_k
-    df_scores = df_scores.sort_values('final_score', ascending=False)
+    #score em blocos, em paralelo, guardando só o top_k de cada bloco
+    top, sims, pop_norm, final_score = score_top_k(index.normalized_rows(genre_weighting),
+                                                   index.popularity, index.max_popularity,
+                                                   user_profile[0], candidates, pool_size,
+                                                   underground_weight)
 
-    return df_scores.head(top_k)
+    return diversify(df_with_genres, index, top, sims, pop_norm, final_score, top_k, diversity,
+                     genre_weighting)
 
 
 # %%
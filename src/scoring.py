@@ -0,0 +1,254 @@
+#%%
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+#%%
+
+#linhas da matriz de gêneros processadas por bloco
+CHUNK_SIZE = 16_384
+
+#tamanho do conjunto de candidatos reordenado pelo MMR (diversidade)
+MMR_POOL_SIZE = 300
+
+#threads do pool de score (o NumPy libera o GIL nas operações de matriz)
+SCORING_WORKERS = os.cpu_count() or 1
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_scoring_executor() -> ThreadPoolExecutor:
+    """
+    Pool de threads compartilhado por todas as requisições de score,
+    criado na primeira chamada.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=SCORING_WORKERS, thread_name_prefix='scoring')
+        return _executor
+
+# %%
+
+class SparseRows:
+    """
+    Linhas esparsas (formato CSR) de uma matriz de gêneros já ponderada e
+    normalizada (norma L2 = 1 por linha), calculadas uma vez por catálogo
+    (ver `CatalogIndex.normalized_rows`).
+
+    Com as linhas normalizadas, o cosseno entre uma linha e o perfil é só um
+    produto escalar esparso dividido pela norma do perfil: a norma das
+    linhas não é recalculada a cada pedido.
+    """
+
+    def __init__(self, indptr: np.ndarray, indices: np.ndarray, data: np.ndarray, n_cols: int):
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+        self.shape = (len(indptr) - 1, n_cols)
+
+    def dot(self, rows: np.ndarray, vector: np.ndarray) -> np.ndarray:
+        """
+        Produto escalar de cada linha `rows` com `vector` (denso), tocando só
+        as entradas não nulas dessas linhas.
+        """
+        starts = self.indptr[rows]
+        lengths = self.indptr[rows + 1] - starts
+        total = int(lengths.sum())
+
+        #posições, em `data`, de todas as entradas das linhas pedidas
+        offsets = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+        entries = offsets + np.arange(total)
+
+        products = self.data[entries] * vector[self.indices[entries]]
+        owner = np.repeat(np.arange(len(rows)), lengths)
+        return np.bincount(owner, weights=products, minlength=len(rows))
+
+# %%
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    Posições dos `k` maiores valores de `scores`, em ordem crescente de posição.
+
+    Usa `np.partition` (O(n)) em vez de ordenar o vetor inteiro. Empates no
+    k-ésimo valor são resolvidos pela menor posição, o mesmo critério de um
+    `argsort` estável, para que o resultado não dependa da divisão em blocos.
+    """
+    n = len(scores)
+    if k >= n:
+        return np.arange(n)
+    if k <= 0:
+        return np.empty(0, dtype=np.intp)
+
+    kth = np.partition(scores, n - k)[n - k]
+    above = np.flatnonzero(scores > kth)
+    ties = np.flatnonzero(scores == kth)[:k - len(above)]
+    return np.sort(np.concatenate([above, ties]))
+
+
+def _score_chunk(X, rows, profile, profile_norm, popularity, max_pop, w_sim, w_und, k):
+    """
+    Score de um bloco de candidatos; devolve só o top-k local do bloco.
+    """
+    if isinstance(X, SparseRows):
+        #linhas já normalizadas: só o produto escalar esparso
+        sims = X.dot(rows, profile) / profile_norm
+    else:
+        block = np.asarray(X[rows], dtype=float)
+
+        row_norm = np.sqrt(np.einsum('ij,ij->i', block, block))
+        #evita divisão por zero: vetores nulos ficam com similaridade 0
+        row_norm[row_norm == 0] = 1.0
+
+        sims = (block @ profile) / (row_norm * profile_norm)
+
+    pop_norm = popularity[rows] / max_pop
+    final_score = w_sim * sims + w_und * (1 - pop_norm)
+
+    keep = top_k_indices(final_score, k)
+    return rows[keep], sims[keep], pop_norm[keep], final_score[keep]
+
+# %%
+
+def score_top_k(X: np.ndarray,
+                popularity: np.ndarray,
+                max_popularity: float,
+                profile: np.ndarray,
+                candidates: np.ndarray,
+                top_k: int,
+                underground_weight: float = 0.3,
+                chunk_size: int = CHUNK_SIZE,
+                executor: ThreadPoolExecutor = None):
+    """
+    Calcula o score dos candidatos em blocos e devolve só os `top_k` melhores.
+
+    Objetivo da função
+    -------------------
+    Escalar o score para catálogos muito grandes: em vez de montar vetores de
+    similaridade e score do tamanho do catálogo, cada bloco de `chunk_size`
+    linhas é processado por uma thread do pool e reduzido ao seu próprio
+    top-k. Os top-k dos blocos são combinados no final.
+
+    O pico de memória é O(threads × chunk_size × n_gêneros + n_blocos × top_k),
+    independente do tamanho do catálogo, e a vazão cresce com o número de núcleos.
+
+    Parâmetros
+    ----------
+    X : numpy.ndarray ou SparseRows
+        Matriz de gêneros do catálogo (n_artistas × n_gêneros). Com
+        `SparseRows` (linhas já normalizadas), o cosseno de cada bloco é um
+        produto escalar esparso; com uma matriz densa, as normas das linhas
+        do bloco são calculadas na hora.
+    popularity : numpy.ndarray
+        Popularidade de cada artista.
+    max_popularity : float
+        Popularidade usada para normalizar `pop_norm` (0 é tratado como 1).
+    profile : numpy.ndarray, shape (n_gêneros,)
+        Vetor de perfil do usuário.
+    candidates : numpy.ndarray
+        Posições (linhas de `X`) a pontuar, em ordem crescente.
+    top_k : int
+        Quantos artistas devolver.
+    underground_weight : float, opcional (default=0.3)
+        Peso do fator underground (ver `recommend_artists_by_genre`).
+    chunk_size : int, opcional
+        Linhas por bloco. Candidatos que cabem em um bloco são pontuados na
+        própria thread, sem passar pelo pool.
+    executor : ThreadPoolExecutor, opcional
+        Pool a usar. Por padrão, `get_scoring_executor()`.
+
+    Retorno
+    -------
+    tuple[numpy.ndarray, ...]
+        (rows, similarity, pop_norm, final_score) dos `top_k` artistas,
+        ordenados por `final_score` decrescente (empates pela posição).
+    """
+    profile = np.asarray(profile, dtype=float).ravel()
+    profile_norm = np.sqrt(profile @ profile) or 1.0
+    max_pop = max_popularity or 1
+    w_sim = 1.0 - underground_weight
+    w_und = underground_weight
+
+    args = (profile, profile_norm, popularity, max_pop, w_sim, w_und, top_k)
+    blocks = [candidates[i:i + chunk_size] for i in range(0, len(candidates), chunk_size)]
+
+    if len(blocks) <= 1:
+        parts = [_score_chunk(X, rows, *args) for rows in blocks]
+    else:
+        executor = executor or get_scoring_executor()
+        parts = list(executor.map(lambda rows: _score_chunk(X, rows, *args), blocks))
+
+    if not parts:
+        empty = np.empty(0)
+        return np.empty(0, dtype=np.intp), empty, empty, empty
+
+    #junta os top-k dos blocos (já em ordem de posição) e escolhe o top-k global
+    rows, sims, pop_norm, final_score = (np.concatenate(p) for p in zip(*parts))
+    order = np.argsort(-final_score, kind='stable')[:top_k]
+    return rows[order], sims[order], pop_norm[order], final_score[order]
+
+# %%
+
+def mmr_rerank(vectors: np.ndarray, relevance: np.ndarray, k: int, diversity: float = 0.3) -> np.ndarray:
+    """
+    Reordenação por relevância marginal máxima (MMR).
+
+    Objetivo da função
+    -------------------
+    Evitar listas dominadas por artistas com o mesmo conjunto de gêneros: a
+    cada passo, escolhe o candidato que maximiza
+
+        (1 - diversity) * relevância - diversity * (maior similaridade com os já escolhidos)
+
+    O que esta função faz?
+    -----------------------
+    - Normaliza as linhas de `vectors` uma vez (cosseno = produto escalar).
+    - Mantém um vetor `max_sim` com a maior similaridade de cada candidato
+      com os já escolhidos. A cada escolha, ele é atualizado com um único
+      produto matriz × vetor, sem laços em pares em Python. O custo total é
+      O(k × pool × n_gêneros).
+
+    Parâmetros
+    ----------
+    vectors : numpy.ndarray, shape (pool, n_gêneros)
+        Vetores de gênero dos candidatos.
+    relevance : numpy.ndarray, shape (pool,)
+        Score de relevância de cada candidato (ex.: `final_score`).
+    k : int
+        Quantos candidatos escolher.
+    diversity : float, opcional (default=0.3)
+        0 = só relevância (ordem original); 1 = só diversidade.
+
+    Retorno
+    -------
+    numpy.ndarray
+        Posições (em `relevance`) dos escolhidos, na ordem de escolha.
+        Empates ficam com a menor posição.
+    """
+    n = len(relevance)
+    k = min(k, n)
+
+    V = np.asarray(vectors, dtype=float)
+    norms = np.sqrt(np.einsum('ij,ij->i', V, V))
+    norms[norms == 0] = 1.0
+    V = V / norms[:, None]
+
+    base = (1.0 - diversity) * np.asarray(relevance, dtype=float)
+    max_sim = np.zeros(n)
+    available = np.ones(n, dtype=bool)
+    selected = np.empty(k, dtype=np.intp)
+
+    for i in range(k):
+        mmr = np.where(available, base - diversity * max_sim, -np.inf)
+        j = int(np.argmax(mmr))
+        selected[i] = j
+        available[j] = False
+        np.maximum(max_sim, V @ V[j], out=max_sim)
+
+    return selected
+
+# %%
@@ -0,0 +1,22 @@
+#%%
+
+#parâmetros do app compartilhados entre `app_streamlit.py` e os processos
+#offline (ex.: aquecimento em `src.analytics`). Este módulo não importa nada
+#pesado: o app o carrega já na primeira renderização
+
+#universos persistidos em disco valem por 1 dia
+UNIVERSE_MAX_AGE = 24 * 3600
+
+#tamanho da expansão a partir das bandas (também faz parte do diretório do universo)
+MAX_RELATED = 30
+MAX_PER_GENRE_SEARCH = 30
+
+#orçamento da montagem do universo em um pedido interativo: ao estourar,
+#as recomendações saem com o que já foi coletado
+UNIVERSE_DEADLINE_S = 20.0
+UNIVERSE_MAX_API_CALLS = 60
+
+#parâmetros padrão da tela do app (valores iniciais dos controles)
+DEFAULT_REQUEST = {'top_k': 15, 'underground_weight': 0.3, 'max_popularity': 50, 'diversity': 0.0}
+
+# %%
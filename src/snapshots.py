@@ -0,0 +1,250 @@
+#%%
+
+import argparse
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+
+import pandas as pd
+from src.catalog_index import catalog_version, get_catalog_index, pin_catalog_index, unpin_catalog_index
+from src.catalog_store import catalog_meta_path, load_catalog, save_catalog
+from src.features import add_genre_vectors
+from src.name_index import ARTISTS_CSV_PATH, get_name_index
+
+#%%
+
+SNAPSHOT_DIR = Path(__file__).resolve().parent.parent / 'data' / 'snapshots'
+
+#arquivo com a versão publicada (trocado de forma atômica)
+CURRENT_FILE = 'CURRENT'
+
+# %%
+
+class SnapshotStore:
+    """
+    Snapshots versionados e imutáveis do catálogo de artistas.
+
+    Layout
+    ------
+        data/snapshots/
+            <versão>/      catálogo no formato de `save_catalog`: metadados,
+                           matriz de gêneros (genres.npy) e vocabulário
+                           (nomes das colunas de gênero, em meta.json)
+            CURRENT        versão publicada
+
+    - A versão é o próprio `catalog_version` do conteúdo, então um snapshot
+      nunca é reescrito: publicar o mesmo catálogo de novo reaproveita o
+      diretório existente.
+    - Publicar = gravar o snapshot e depois trocar `CURRENT` com `os.replace`.
+      Leitores veem ou a versão anterior ou a nova, nunca um estado misto.
+    """
+
+    def __init__(self, root=SNAPSHOT_DIR):
+        self.root = Path(root)
+
+    def path(self, version: str) -> Path:
+        return self.root / version
+
+    def current_version(self):
+        try:
+            return (self.root / CURRENT_FILE).read_text(encoding='utf-8').strip() or None
+        except FileNotFoundError:
+            return None
+
+    def versions(self) -> list[str]:
+        """
+        Versões gravadas, da mais antiga para a mais nova.
+        """
+        if not self.root.exists():
+            return []
+        metas = {d.name: catalog_meta_path(d) for d in self.root.iterdir() if d.is_dir()}
+        metas = {name: meta for name, meta in metas.items() if meta is not None}
+        return sorted(metas, key=lambda name: metas[name].stat().st_mtime)
+
+    def publish(self, df_with_genres: pd.DataFrame) -> str:
+        """
+        Grava o catálogo como snapshot (se essa versão ainda não existe) e o
+        torna a versão atual. Retorna a versão.
+        """
+        version = catalog_version(df_with_genres)
+        if catalog_meta_path(self.path(version)) is None:
+            save_catalog(df_with_genres, self.path(version))
+
+        tmp = self.root / f'.{CURRENT_FILE}.{os.getpid()}.tmp'
+        tmp.write_text(version, encoding='utf-8')
+        os.replace(tmp, self.root / CURRENT_FILE)
+        return version
+
+    def load(self, version: str = None) -> pd.DataFrame:
+        """
+        Abre um snapshot (default: o atual) com `load_catalog` (mmap, sem cópia).
+        """
+        version = version or self.current_version()
+        if version is None:
+            raise FileNotFoundError(f'Nenhum snapshot publicado em {self.root}')
+        return load_catalog(self.path(version))
+
+    def prune(self, keep: int = 3) -> list[str]:
+        """
+        Apaga snapshots antigos, mantendo o atual e os `keep` mais novos além dele.
+        Processos que ainda têm um snapshot apagado aberto continuam lendo
+        normalmente (o mmap segura os arquivos até ser fechado).
+        """
+        current = self.current_version()
+        versions = [v for v in self.versions() if v != current]
+        old = versions[:max(len(versions) - keep, 0)]
+        for version in old:
+            shutil.rmtree(self.path(version), ignore_errors=True)
+        return old
+
+# %%
+
+def build_snapshot(csv_path=ARTISTS_CSV_PATH, store: SnapshotStore = None, verbose: bool = True) -> str:
+    """
+    Monta um snapshot offline a partir dos artistas coletados (CSV no formato
+    de `data/artists_basic.csv`) e o publica. Nenhuma chamada à API.
+    """
+    store = store or SnapshotStore()
+
+    df_artists = pd.read_csv(csv_path)
+    df_with_genres, _ = add_genre_vectors(df_artists, verbose=verbose)
+    df_with_genres = df_with_genres[df_with_genres['genres'].apply(len) > 0].reset_index(drop=True)
+
+    version = store.publish(df_with_genres)
+    if verbose:
+        print(f'\nSnapshot publicado: {version} ({len(df_with_genres)} artistas)')
+    return version
+
+# %%
+
+class SnapshotServer:
+    """
+    Mantém, no processo que serve requisições, o snapshot atual do catálogo
+    e o troca por um novo em segundo plano.
+
+    Objetivo da classe
+    -------------------
+    Atualizações do catálogo nunca adicionam latência a um pedido:
+
+    - `get()` só devolve a referência ao DataFrame atual (sem I/O).
+    - Uma thread de fundo verifica `CURRENT` a cada `poll_interval` segundos.
+      Quando a versão muda, ela abre o snapshot novo, constrói o
+      `CatalogIndex` dele e registra os nomes no índice de nomes. Só então
+      troca a referência ao par (DataFrame, índice), em uma única atribuição.
+    - O índice do snapshot ativo fica fixado (`pin_catalog_index`): os
+      universos montados a partir da API passam pelo LRU de índices sem
+      descartá-lo, então nenhum pedido reconstrói o índice do snapshot.
+    - Pedidos em andamento seguem com o DataFrame que já pegaram (o antigo).
+      Os novos pegam o novo.
+    - Depois da troca, as respostas em cache da versão antiga são descartadas
+      (`invalidate_catalog`).
+    """
+
+    def __init__(self, store: SnapshotStore = None, poll_interval: float = 30.0):
+        self.store = store or SnapshotStore()
+        self.poll_interval = poll_interval
+        #(DataFrame, CatalogIndex) do snapshot ativo, trocados juntos
+        self._current = None
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def version(self):
+        current = self._current
+        return None if current is None else current[1].version
+
+    def get(self):
+        """
+        DataFrame do snapshot atual, ou None se nenhum foi carregado ainda.
+        """
+        current = self._current
+        return None if current is None else current[0]
+
+    def _prepare(self, version: str):
+        df_with_genres = self.store.load(version)
+        #estruturas derivadas prontas antes da troca: o primeiro pedido não paga por elas
+        index = get_catalog_index(df_with_genres)
+
+        name_index = get_name_index()
+        for artist in df_with_genres[['id', 'name', 'popularity', 'genres', 'spotify_url']].itertuples(index=False):
+            name_index.add({'id': artist.id, 'name': artist.name, 'popularity': int(artist.popularity),
+                            'genres': artist.genres, 'external_urls': {'spotify': artist.spotify_url}})
+        return df_with_genres, index
+
+    def refresh(self) -> bool:
+        """
+        Carrega e ativa a versão publicada, se for diferente da atual.
+        Retorna True se houve troca.
+        """
+        from src.cache.result_cache import invalidate_catalog
+
+        version = self.store.current_version()
+        if version is None or version == self.version:
+            return False
+
+        df_with_genres, index = self._prepare(version)
+        pin_catalog_index(index)
+
+        with self._lock:
+            old_version = self.version
+            self._current = (df_with_genres, index)
+
+        if old_version is not None and old_version != index.version:
+            #pedidos em andamento ainda acham o índice antigo no LRU de índices
+            unpin_catalog_index(old_version)
+            invalidate_catalog(old_version)
+        print(f'Snapshot do catálogo ativo: {version}')
+        return True
+
+    def start(self):
+        """
+        Carrega o snapshot atual (se houver) e inicia a verificação em segundo plano.
+        """
+        if self._thread is not None:
+            return self
+
+        self.refresh()
+
+        def loop():
+            while True:
+                time.sleep(self.poll_interval)
+                try:
+                    self.refresh()
+                except Exception as e:
+                    print(f'Erro ao carregar snapshot do catálogo: {e}')
+
+        self._thread = threading.Thread(target=loop, name='snapshot-loader', daemon=True)
+        self._thread.start()
+        return self
+
+# %%
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Snapshots versionados do catálogo de artistas.')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    build = sub.add_parser('build', help='Monta e publica um snapshot a partir de um CSV de artistas.')
+    build.add_argument('--csv', default=str(ARTISTS_CSV_PATH))
+    build.add_argument('--keep', type=int, default=3, help='Snapshots antigos a manter (além do atual).')
+
+    sub.add_parser('list', help='Lista os snapshots gravados.')
+
+    args = parser.parse_args(argv)
+    store = SnapshotStore()
+
+    if args.command == 'build':
+        build_snapshot(args.csv, store)
+        for version in store.prune(keep=args.keep):
+            print(f'Snapshot removido: {version}')
+    elif args.command == 'list':
+        current = store.current_version()
+        for version in store.versions():
+            print(f"{'*' if version == current else ' '} {version}")
+
+
+if __name__ == '__main__':
+    main()
+
+# %%
@@ -1,12 +1,50 @@
 #%%
-from dotenv import load_dotenv
 import os
-import spotipy
-from spotipy.oauth2 import SpotifyClientCredentials
+import threading
 
 #%%
 
-load_dotenv()
+#spotipy e dotenv são importados só quando um cliente é criado, para não
+#pesar no tempo de inicialização de quem apenas importa este módulo
+_dotenv_loaded = False
+
+
+def _load_env_once():
+    global _dotenv_loaded
+    if not _dotenv_loaded:
+        from dotenv import load_dotenv
+        load_dotenv()
+        _dotenv_loaded = True
+
+#um gerenciador de autenticação (e uma thread de renovação) por processo
+_auth_manager = None
+_auth_lock = threading.Lock()
+
+#clientes (sessões HTTP) no pool; o default casa com as buscas em paralelo do dataset
+POOL_SIZE = int(os.getenv('SPOTIFY_POOL_SIZE', '4'))
+
+
+def get_auth_manager():
+    """
+    Gerenciador de autenticação compartilhado pelo processo, com o token no
+    `SharedTokenStore` (arquivo único para todos os processos, ver
+    `src.token_store`).
+
+    Na primeira chamada, garante um token válido (buscando um só se nenhum
+    outro processo já tiver um) e inicia a renovação em segundo plano.
+    """
+    global _auth_manager
+    from src.token_store import make_auth_manager, start_token_refresher
+
+    with _auth_lock:
+        if _auth_manager is None:
+            _load_env_once()
+            auth_manager = make_auth_manager(os.getenv('SPOTIFY_CLIENT_ID'),
+                                             os.getenv('SPOTIFY_CLIENT_SECRET'))
+            auth_manager.get_access_token()
+            start_token_refresher(auth_manager)
+            _auth_manager = auth_manager
+        return _auth_manager
 
 # %%
 
@@ -30,11 +68,13 @@ def get_spotify_client():
        Essas variáveis devem estar definidas em um arquivo `.env` ou configuradas
        manualmente no ambiente.
 
-    2) Cria um objeto `SpotifyClientCredentials`, responsável por gerar o token
-       de acesso via fluxo Client Credentials.
+    2) Obtém o gerenciador de autenticação do processo (`get_auth_manager`):
+       fluxo Client Credentials com o token guardado em um arquivo
+       compartilhado entre processos e renovado em segundo plano antes de
+       expirar. Nenhuma requisição espera por um token novo.
 
-    3) Cria um cliente Spotipy:
-         sp = spotipy.Spotify(auth_manager=auth_manager)
+    3) Cria um pool de clientes Spotipy (`SpotifyClientPool`, `POOL_SIZE`
+       sessões HTTP reaproveitáveis) com esse gerenciador.
 
     4) Retorna o cliente pronto para:
          - buscar artistas
@@ -42,17 +82,43 @@ def get_spotify_client():
          - consultar álbuns
          - acessar endpoints públicos do Spotify
 
+    Observações
+    -----------
+    O `.env` é carregado na primeira chamada (e só nela), não na importação
+    do módulo. Buscas de token contam na métrica `spotify.token_fetches`.
+
+    Modos de gravação / reprodução (cassetes)
+    -----------------------------------------
+    A variável de ambiente `SPOTIFY_CASSETTE_MODE` muda o cliente retornado:
+
+    - `record` : cliente real envolvido por `RecordingSpotify`, que grava cada
+                 busca (resposta + latência) no cassete.
+    - `replay` : `ReplaySpotify`, que responde a partir do cassete, sem rede e
+                 sem credenciais, reproduzindo a latência original.
+
+    O arquivo usado é `SPOTIFY_CASSETTE_PATH` (default `data/cassettes/spotify.jsonl`).
+    Fora desses modos, o cliente é envolvido por `InstrumentedSpotify`, que só
+    conta chamadas e tempo de API em `src.metrics`.
+
     """
-    client_id = os.getenv('SPOTIFY_CLIENT_ID')
-    client_secret = os.getenv('SPOTIFY_CLIENT_SECRET')
-    
-    auth_manager = SpotifyClientCredentials(
-        client_id=client_id,
-        client_secret=client_secret
-    )
-    sp = spotipy.Spotify(auth_manager=auth_manager)
+    from src.cassette import CASSETTE_PATH, InstrumentedSpotify, RecordingSpotify, ReplaySpotify
+
+    _load_env_once()
+
+    mode = os.getenv('SPOTIFY_CASSETTE_MODE', '').lower()
+    cassette_path = os.getenv('SPOTIFY_CASSETTE_PATH') or CASSETTE_PATH
+
+    if mode == 'replay':
+        return ReplaySpotify(cassette_path)
+
+    from src.token_store import SpotifyClientPool
+
+    sp = SpotifyClientPool(get_auth_manager(), size=POOL_SIZE)
+
+    if mode == 'record':
+        return RecordingSpotify(sp, cassette_path)
     
-    return sp
+    return InstrumentedSpotify(sp)
 
 # %%
 
@@ -0,0 +1,227 @@
+#%%
+
+import fcntl
+import json
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from src import metrics
+
+#%%
+
+#caminho fixo (não depende do diretório de trabalho, ao contrário do `.cache`
+#padrão do spotipy); pode ser trocado por SPOTIFY_TOKEN_PATH
+TOKEN_PATH = Path(__file__).resolve().parent.parent / 'data' / 'spotify_token.json'
+
+#o token é renovado em segundo plano quando faltar menos que isso para expirar
+REFRESH_MARGIN_S = 300
+
+#margem do próprio spotipy: abaixo disso, o token é considerado expirado
+EXPIRY_MARGIN_S = 60
+
+# %%
+
+class SharedTokenStore:
+    """
+    Armazena o token de acesso do Spotify em um arquivo compartilhado por
+    todos os processos da máquina (workers do Streamlit, jobs em lote).
+
+    - Leituras usam lock compartilhado (`fcntl.LOCK_SH`) e escritas são
+      atômicas (arquivo temporário + `os.replace`).
+    - `exclusive()` dá um lock exclusivo entre processos, usado para que só
+      um processo busque um token novo por vez. Os outros esperam e leem o
+      token que ele gravou.
+    - O último token lido fica em memória. O arquivo só é relido quando esse
+      token está perto de expirar.
+    """
+
+    def __init__(self, path=None):
+        self.path = Path(path or os.getenv('SPOTIFY_TOKEN_PATH') or TOKEN_PATH)
+        self.lock_path = self.path.with_name(self.path.name + '.lock')
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._token = None
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _file_lock(self, mode):
+        with open(self.lock_path, 'a') as f:
+            fcntl.flock(f, mode)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def exclusive(self):
+        return self._file_lock(fcntl.LOCK_EX)
+
+    def read(self, margin: float = 0, locked: bool = False):
+        """
+        Token mais recente (memória ou arquivo), ou None se não houver um com
+        pelo menos `margin` segundos de validade.
+
+        `locked=True` quando quem chama já está dentro de `exclusive()`
+        (o flock não é reentrante entre descritores do mesmo processo).
+        """
+        with self._lock:
+            token = self._token
+        if token is not None and seconds_left(token) > margin:
+            return token
+
+        try:
+            if locked:
+                token = self._read_file()
+            else:
+                with self._file_lock(fcntl.LOCK_SH):
+                    token = self._read_file()
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+        with self._lock:
+            self._token = token
+        return token if seconds_left(token) > margin else None
+
+    def _read_file(self):
+        with open(self.path, encoding='utf-8') as f:
+            return json.load(f)
+
+    def write(self, token: dict):
+        tmp = self.path.with_name(f'{self.path.name}.{os.getpid()}.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(token, f)
+        os.replace(tmp, self.path)
+        with self._lock:
+            self._token = token
+
+
+def seconds_left(token: dict) -> float:
+    return token.get('expires_at', 0) - time.time()
+
+# %%
+
+def make_auth_manager(client_id: str, client_secret: str, store: SharedTokenStore = None):
+    """
+    Cria o gerenciador de autenticação (Client Credentials) que usa o
+    `SharedTokenStore` em vez do arquivo `.cache` do spotipy.
+
+    A classe é definida aqui dentro para que o spotipy só seja importado
+    quando um cliente real é criado.
+    """
+    from spotipy.cache_handler import CacheHandler
+    from spotipy.oauth2 import SpotifyClientCredentials
+
+    store = store or SharedTokenStore()
+
+    class _StoreHandler(CacheHandler):
+        def get_cached_token(self):
+            return store.read(margin=EXPIRY_MARGIN_S)
+
+        def save_token_to_cache(self, token_info):
+            store.write(token_info)
+
+    class SharedClientCredentials(SpotifyClientCredentials):
+        """
+        `SpotifyClientCredentials` com token compartilhado entre processos:
+
+        - token válido na memória ou no arquivo → nenhuma chamada de rede;
+        - senão, pega o lock exclusivo, relê o arquivo (outro processo pode
+          ter acabado de renovar) e só então busca um token novo;
+        - cada busca conta em `spotify.token_fetches`.
+        """
+
+        def get_access_token(self, as_dict=False, check_cache=True):
+            token = store.read(margin=EXPIRY_MARGIN_S) if check_cache else None
+            if token is None:
+                token = self.refresh(margin=EXPIRY_MARGIN_S if check_cache else None)
+            return token if as_dict else token['access_token']
+
+        def refresh(self, margin=REFRESH_MARGIN_S):
+            """
+            Busca um token novo, a menos que o do arquivo ainda tenha mais que
+            `margin` segundos de validade (None = busca sempre).
+            """
+            with store.exclusive():
+                token = store.read(margin=margin, locked=True) if margin is not None else None
+                if token is not None:
+                    return token
+
+                token = self._add_custom_values_to_token_info(self._request_access_token())
+                store.write(token)
+                metrics.incr('spotify.token_fetches')
+                return token
+
+    auth_manager = SharedClientCredentials(client_id=client_id,
+                                           client_secret=client_secret,
+                                           cache_handler=_StoreHandler())
+    auth_manager.store = store
+    return auth_manager
+
+
+def start_token_refresher(auth_manager, interval: float = 30.0) -> threading.Thread:
+    """
+    Thread de fundo que renova o token antes de expirar
+    (`REFRESH_MARGIN_S`), para que nenhuma requisição espere pela renovação.
+    Erros de rede são só registrados: a próxima volta tenta de novo, e o
+    token atual continua valendo até a margem do spotipy.
+    """
+    def loop():
+        while True:
+            try:
+                auth_manager.refresh(margin=REFRESH_MARGIN_S)
+            except Exception as e:
+                metrics.incr('spotify.token_errors')
+                print(f'Erro ao renovar token do Spotify: {e}')
+            time.sleep(interval)
+
+    thread = threading.Thread(target=loop, name='spotify-token-refresher', daemon=True)
+    thread.start()
+    return thread
+
+# %%
+
+class SpotifyClientPool:
+    """
+    Conjunto de clientes `spotipy.Spotify` reaproveitáveis, cada um com sua
+    própria sessão HTTP (conexões mantidas abertas), todos usando o mesmo
+    gerenciador de autenticação.
+
+    Expõe a mesma interface do cliente: cada chamada (ex.: `search`) pega um
+    cliente livre do pool, faz a chamada e o devolve. Assim, buscas em
+    paralelo (ver `iter_expand_artists_from_user_likes`) não dividem uma
+    mesma `requests.Session` entre threads.
+    """
+
+    def __init__(self, auth_manager, size: int = 4, **spotify_kwargs):
+        import spotipy
+
+        self.auth_manager = auth_manager
+        self.size = size
+        self._clients = queue.Queue()
+        for _ in range(size):
+            self._clients.put(spotipy.Spotify(auth_manager=auth_manager, **spotify_kwargs))
+
+    @contextmanager
+    def client(self):
+        sp = self._clients.get()
+        try:
+            yield sp
+        finally:
+            self._clients.put(sp)
+
+    def search(self, *args, **kwargs):
+        with self.client() as sp:
+            return sp.search(*args, **kwargs)
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+
+        def call(*args, **kwargs):
+            with self.client() as sp:
+                return getattr(sp, name)(*args, **kwargs)
+        return call
+
+# %%